@@ -0,0 +1,71 @@
+import asyncio
+from collections import deque
+from typing import Callable
+
+
+class BookSink:
+    """
+    Receives a store's books while it is being crawled and writes them in chunks.
+
+    The scraper calls `add` for every book it finds; each time `chunk_size`
+    books have piled up they are handed to `write(chunk)` in a worker
+    thread, so normalization, embedding and the Mongo write overlap with
+    fetching instead of all happening after the crawl, and the crawl never
+    holds the whole store in memory. Chunks are written one at a time, in
+    order. When the writes fall behind, `drain` waits until no more than
+    `max_pending` chunks are queued; the crawl awaits it after every page,
+    so a slow database slows the crawl down instead of piling up books.
+    `close` writes what is left and returns the sum of what `write`
+    returned (e.g. the number of new books); a failed write is raised there.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[dict]], int],
+        chunk_size: int = 500,
+        max_pending: int = 2,
+    ):
+        self.write = write
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self.count = 0
+        self.written = 0
+        self._chunk = []
+        # writes started and not yet awaited, oldest first
+        self._writes = deque()
+
+    def add(self, book: dict) -> None:
+        self._chunk.append(book)
+        self.count += 1
+        if len(self._chunk) >= self.chunk_size:
+            self._start_write()
+
+    def _start_write(self) -> None:
+        chunk, self._chunk = self._chunk, []
+        previous = self._writes[-1] if self._writes else None
+        self._writes.append(asyncio.ensure_future(self._write(previous, chunk)))
+
+    async def _write(self, previous, chunk: list[dict]) -> None:
+        if previous is not None:
+            # a failed chunk fails the ones after it too
+            await previous
+        self.written += await asyncio.to_thread(self.write, chunk) or 0
+
+    async def drain(self) -> None:
+        """Wait until at most `max_pending` chunks are waiting to be written."""
+        while len(self._writes) > self.max_pending:
+            oldest = self._writes[0]
+            await asyncio.wait([oldest])
+            if oldest.exception() is not None:
+                # close raises it; the crawl isn't held up meanwhile
+                return
+            self._writes.popleft()
+
+    async def close(self) -> int:
+        if self._chunk:
+            self._start_write()
+        if self._writes:
+            # each write awaits the one before it
+            writes, self._writes = self._writes, deque()
+            await writes[-1]
+        return self.written
@@ -0,0 +1,74 @@
+import re
+from collections.abc import Collection
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+# Query params that never change the page content on any store.
+TRACKING_PARAMS = {"fbclid", "gclid", "srsltid", "_ga"}
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_ESCAPE_RE = re.compile(r"%([0-9A-Fa-f]{2})")
+_UNRESERVED = set(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+# everything RFC 3986 allows unescaped in a path, plus % so existing escapes survive
+_PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+
+
+def _normalize_escapes(text: str) -> str:
+    """
+    Decode escapes of unreserved characters (%41 -> A) and lowercase the rest.
+
+    Lowercase hex matches what WordPress emits for Arabic slugs (Ismaeel,
+    Zakariyya), so the stored book URLs stay the same as before.
+    """
+
+    def fix(match: re.Match) -> str:
+        char = chr(int(match.group(1), 16))
+        if char in _UNRESERVED:
+            return char
+        return "%" + match.group(1).lower()
+
+    return _ESCAPE_RE.sub(fix, text)
+
+
+def canonical_url(
+    url: str,
+    keep_params: Collection[str] | None = None,
+    drop_params: Collection[str] = (),
+    trailing_slash: bool | None = None,
+) -> str:
+    """
+    Normalize a URL so that trivially different links to the same page compare equal.
+
+    - lowercases scheme and host, drops default ports and the fragment
+    - percent-encodes raw non-ASCII characters and normalizes existing escapes
+    - removes tracking params, any param in `drop_params`, and (when
+      `keep_params` is given) every param not in it; the rest are sorted
+    - `trailing_slash=True` adds a slash to paths without a file extension,
+      `False` strips it, None leaves the path alone
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = _normalize_escapes(quote(parts.path, safe=_PATH_SAFE)) or "/"
+    if trailing_slash is True and not path.endswith("/"):
+        if "." not in path.rsplit("/", 1)[-1]:
+            path += "/"
+    elif trailing_slash is False and path != "/":
+        path = path.rstrip("/") or "/"
+
+    params = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TRACKING_PARAMS
+        and not key.startswith("utm_")
+        and key not in drop_params
+        and (keep_params is None or key in keep_params)
+    ]
+    query = _normalize_escapes(urlencode(sorted(params), quote_via=quote))
+
+    return urlunsplit((scheme, host, path, query, ""))
@@ -0,0 +1,142 @@
+"""
+Decoding of compressed response bodies.
+
+`fetch_page` reads bodies with aiohttp's decompression off, so it can count
+the bytes that actually crossed the wire, and decodes them here. brotli and
+zstd are optional dependencies (Brotli / brotlicffi, and `compression.zstd`
+or the backports.zstd package before Python 3.14), the same modules aiohttp
+and urllib3 use. `ACCEPT_ENCODING` only advertises the codings that can be
+decoded in this environment, so every client in the repo can read what the
+servers send.
+"""
+
+import gzip
+import zlib
+
+try:
+    import brotlicffi as brotli
+except ImportError:
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+
+def _inflate(body: bytes) -> bytes:
+    try:
+        return zlib.decompress(body)
+    except zlib.error:
+        # plenty of servers send raw deflate without the zlib header
+        return zlib.decompress(body, -zlib.MAX_WBITS)
+
+
+DECODERS = {
+    "gzip": gzip.decompress,
+    "x-gzip": gzip.decompress,
+    "deflate": _inflate,
+}
+if brotli is not None:
+    DECODERS["br"] = brotli.decompress
+if zstd is not None:
+    DECODERS["zstd"] = zstd.decompress
+
+# best-compressing first
+ACCEPT_ENCODING = ", ".join(
+    coding for coding in ("zstd", "br", "gzip", "deflate") if coding in DECODERS
+)
+
+
+class ContentEncodingError(Exception):
+    pass
+
+
+class _Inflater:
+    """Streaming deflate that, like `_inflate`, also accepts raw deflate."""
+
+    def __init__(self):
+        self._obj = None
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if self._obj is None:
+            zlib_header = (
+                len(chunk) >= 2
+                and chunk[0] & 0x0F == 8
+                and ((chunk[0] << 8) | chunk[1]) % 31 == 0
+            )
+            self._obj = zlib.decompressobj(zlib.MAX_WBITS if zlib_header else -zlib.MAX_WBITS)
+        return self._obj.decompress(chunk)
+
+    def flush(self) -> bytes:
+        return self._obj.flush() if self._obj is not None else b""
+
+
+def _feed(decoder, chunk: bytes) -> bytes:
+    # Brotli's Decompressor calls it process()
+    process = getattr(decoder, "process", None)
+    return process(chunk) if process is not None else decoder.decompress(chunk)
+
+
+def _stream_decoder(coding: str):
+    if coding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if coding == "deflate":
+        return _Inflater()
+    if coding == "br" and brotli is not None:
+        return brotli.Decompressor()
+    if coding == "zstd" and zstd is not None:
+        return zstd.ZstdDecompressor()
+    raise ContentEncodingError(f"Unsupported Content-Encoding {coding!r}")
+
+
+class StreamDecoder:
+    """Incremental `decode`, for bodies read a chunk at a time."""
+
+    def __init__(self, content_encoding: str | None):
+        codings = [c.strip().lower() for c in (content_encoding or "").split(",")]
+        self._steps = [
+            (coding, _stream_decoder(coding))
+            for coding in reversed(codings)
+            if coding not in ("", "identity")
+        ]
+
+    def decompress(self, chunk: bytes) -> bytes:
+        for coding, decoder in self._steps:
+            try:
+                chunk = _feed(decoder, chunk)
+            except Exception as e:
+                raise ContentEncodingError(f"Could not decode {coding} body: {e}") from e
+        return chunk
+
+    def flush(self) -> bytes:
+        """Whatever the decoders still hold once the whole body was fed in."""
+        data = b""
+        for coding, decoder in self._steps:
+            if data:
+                data = _feed(decoder, data)
+            if hasattr(decoder, "flush"):
+                data += decoder.flush()
+        return data
+
+
+def decode(body: bytes, content_encoding: str | None) -> bytes:
+    """Undo a response's Content-Encoding (codings listed in the order they were applied)."""
+    codings = [c.strip().lower() for c in (content_encoding or "").split(",")]
+    for coding in reversed(codings):
+        if coding in ("", "identity"):
+            continue
+        decoder = DECODERS.get(coding)
+        if decoder is None:
+            raise ContentEncodingError(f"Unsupported Content-Encoding {coding!r}")
+        try:
+            body = decoder(body)
+        except Exception as e:
+            raise ContentEncodingError(f"Could not decode {coding} body: {e}") from e
+    return body
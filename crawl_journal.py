@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+import time
+
+
+class CrawlJournal:
+    """
+    Append-only JSONL record of a crawl in progress, for resuming after a crash.
+
+    Each line is one event: `{"q": url}` when a URL is queued,
+    `{"b": book, "u": url}` when a page produced a book and `{"d": url}` once
+    a page has been handled completely. Events are buffered in memory and
+    written by `autoflush` in a worker thread, so the event loop never waits
+    on the disk. A crash loses at most the last flush interval, and pages
+    that were in flight are simply fetched again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._buffer = []
+        # one write at a time, so batches land in the order they were taken
+        self._writing = asyncio.Lock()
+
+    def load(self, max_age: float) -> tuple[list[str], set[str], list[dict]] | None:
+        """
+        Replay the journal left by an interrupted crawl.
+
+        Returns (URLs still to crawl, URLs already done, books from the done
+        pages), or None when there is no journal younger than `max_age`
+        seconds.
+        """
+        try:
+            if os.path.getmtime(self.path) < time.time() - max_age:
+                return None
+            file = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+        queued = {}
+        done = set()
+        books = {}
+        line = "\n"
+        with file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash can cut the last line short
+                    continue
+                if "q" in event:
+                    queued[event["q"]] = None
+                elif "b" in event:
+                    books[event["u"]] = event["b"]
+                elif "d" in event:
+                    done.add(event["d"])
+
+        if not line.endswith("\n"):
+            # start the events of the resumed crawl on a line of their own
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write("\n")
+
+        pending = [url for url in queued if url not in done]
+        return pending, done, [book for url, book in books.items() if url in done]
+
+    def queued(self, url: str) -> None:
+        self._buffer.append({"q": url})
+
+    def book(self, url: str, book: dict) -> None:
+        self._buffer.append({"b": book, "u": url})
+
+    def done(self, url: str) -> None:
+        self._buffer.append({"d": url})
+
+    def _write(self, events: list[dict]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+            file.flush()
+            os.fsync(file.fileno())
+
+    async def flush(self) -> None:
+        async with self._writing:
+            events, self._buffer = self._buffer, []
+            if events:
+                await asyncio.to_thread(self._write, events)
+
+    async def autoflush(self, interval: float = 5.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def remove(self) -> None:
+        """Drop the journal once the crawl has finished."""
+        self._buffer = []
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
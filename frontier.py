@@ -0,0 +1,66 @@
+import heapq
+import itertools
+from collections.abc import Iterable
+
+
+class CrawlFrontier:
+    """
+    Priority queue of URLs still to crawl plus the set of URLs already handed out.
+
+    Every URL is fetched at most once: `add` ignores anything that is already
+    queued or visited, and `pop` moves a URL from the queue to `visited`.
+    `pop` returns the queued URL with the lowest priority; URLs with equal
+    priority come out in the order they were added, so a frontier used
+    without priorities is plain FIFO. Membership checks are set lookups and
+    queue operations O(log n), so the cost per discovered link stays small
+    however large the crawl gets. `visited_set` replaces the exact set of
+    visited URLs with another set-like object, e.g. a CompactVisitedSet.
+    """
+
+    def __init__(
+        self, urls: Iterable[str] = (), visited: Iterable[str] = (), visited_set=None
+    ):
+        self._heap: list[tuple[float, int, str]] = []
+        self._order = itertools.count()
+        self._queued: set[str] = set()
+        self.visited = visited_set if visited_set is not None else set()
+        self.visited.update(visited)
+        self.extend(urls)
+
+    def add(self, url: str, priority: float = 0) -> bool:
+        """Queue `url` unless it was seen before. Returns True if it was queued."""
+        if url in self._queued or url in self.visited:
+            return False
+        heapq.heappush(self._heap, (priority, next(self._order), url))
+        self._queued.add(url)
+        return True
+
+    def extend(self, urls: Iterable[str]) -> int:
+        """Queue every new URL in `urls`. Returns how many were queued."""
+        return sum(self.add(url) for url in urls)
+
+    def peek(self) -> str | None:
+        """The URL `pop` would return next, left on the queue. None when empty."""
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self) -> str | None:
+        """Take the next URL off the queue and mark it visited. None when empty."""
+        if not self._heap:
+            return None
+        _, _, url = heapq.heappop(self._heap)
+        self._queued.discard(url)
+        self.visited.add(url)
+        return url
+
+    def queued(self) -> list[str]:
+        """URLs still waiting to be crawled, in crawl order."""
+        return [url for _, _, url in sorted(self._heap)]
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._queued or url in self.visited
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
@@ -0,0 +1,89 @@
+import logging
+from collections import Counter
+
+import aiohttp
+
+logger = logging.getLogger("scraper")
+
+
+class HttpClient:
+    """
+    One aiohttp session and connection pool shared by every store in a run.
+
+    Reusing the pool across stores keeps DNS answers and open keep-alive
+    connections around, so each store doesn't pay for fresh lookups and TLS
+    handshakes. `limit` caps open connections overall and `limit_per_host`
+    per host (0 means no per-host cap; the scrapers' adaptive concurrency
+    already bounds that). `stats` counts new vs reused connections and DNS
+    cache hits, via aiohttp's request tracing.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        ttl_dns_cache: int = 300,
+        keepalive_timeout: float = 30,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+        self.stats = Counter()
+        self._session = None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        def count(key):
+            async def handler(session, context, params):
+                self.stats[key] += 1
+
+            return handler
+
+        trace.on_request_start.append(count("requests"))
+        trace.on_connection_create_end.append(count("connections_created"))
+        trace.on_connection_reuseconn.append(count("connections_reused"))
+        trace.on_dns_cache_hit.append(count("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(count("dns_cache_misses"))
+        return trace
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use inside the running loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.ttl_dns_cache,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[self._trace_config()]
+            )
+        return self._session
+
+    def reuse_ratio(self) -> float:
+        created = self.stats["connections_created"]
+        reused = self.stats["connections_reused"]
+        return reused / (created + reused) if created + reused else 0.0
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"HTTP client: {self.stats['requests']} requests, "
+            f"{self.stats['connections_created']} new connections, "
+            f"{self.stats['connections_reused']} reused ({self.reuse_ratio():.0%}), "
+            f"DNS cache {self.stats['dns_cache_hits']} hits / "
+            f"{self.stats['dns_cache_misses']} misses"
+        )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            self.log_stats()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
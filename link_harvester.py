@@ -0,0 +1,93 @@
+"""
+Link discovery without building a DOM.
+
+`harvest_links` feeds the raw page to lxml's HTML parser with a target
+that only looks at `<a>` start tags. It is the same tokenizer BeautifulSoup's
+lxml builder drives, so it sees exactly the anchors a soup would, but no
+tree is built. Hrefs are made absolute against the page URL, with the
+common absolute and root-relative forms joined without re-parsing the base
+URL each time, and links that can never be crawled (mailto:, javascript:,
+in-page fragments, ...) are dropped.
+"""
+
+from urllib.parse import urljoin, urlsplit
+
+from lxml import etree
+
+# hrefs that never point at another page
+SKIPPED_PREFIXES = ("#", "mailto:", "tel:", "javascript:", "data:")
+
+
+class _AnchorTarget:
+    def __init__(self):
+        self.hrefs = []
+
+    def start(self, tag, attrib):
+        if tag == "a":
+            href = attrib.get("href")
+            if href:
+                self.hrefs.append(href)
+
+    def end(self, tag):
+        pass
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return self.hrefs
+
+
+def iter_hrefs(body: bytes, encoding: str | None = None) -> list[str]:
+    """The href of every `<a>` in `body`, in document order."""
+    parser = etree.HTMLParser(target=_AnchorTarget(), encoding=encoding)
+    parser.feed(body)
+    return parser.close()
+
+
+class LinkJoiner:
+    """`urljoin` against one base URL, with the base parsed once."""
+
+    def __init__(self, base: str):
+        self.base = base
+        parts = urlsplit(base)
+        self.origin = f"{parts.scheme}://{parts.netloc}"
+
+    @staticmethod
+    def _simple(href: str) -> bool:
+        # leave to urljoin: tabs and newlines, IPv6 brackets, dot segments, empty ? or #
+        return (
+            href.isprintable()
+            and "[" not in href
+            and "/." not in href
+            and "?#" not in href
+            and not href.endswith(("?", "#"))
+        )
+
+    def join(self, href: str) -> str | None:
+        """Absolute http(s) URL for `href`, or None if it isn't one."""
+        if href.startswith(SKIPPED_PREFIXES):
+            return None
+        if self._simple(href):
+            if href.startswith(("http://", "https://")):
+                return href
+            if href.startswith("/") and not href.startswith("//"):
+                return self.origin + href
+        try:
+            url = urljoin(self.base, href)
+        except ValueError:
+            # e.g. brackets that aren't an IPv6 host
+            return None
+        return url if url.startswith(("http://", "https://")) else None
+
+
+def absolute_links(hrefs, base: str) -> list[str]:
+    """Absolute, de-duplicated http(s) links for `hrefs` found on `base`."""
+    joiner = LinkJoiner(base)
+    links = (joiner.join(href) for href in dict.fromkeys(hrefs))
+    return list(dict.fromkeys(link for link in links if link))
+
+
+def harvest_links(body: bytes, base: str, encoding: str | None = None) -> list[str]:
+    """Absolute, de-duplicated http(s) links of every `<a href>` in a page."""
+    return absolute_links(iter_hrefs(body, encoding), base)
@@ -1,6 +1,11 @@
 import asyncio
 import argparse
-from datetime import datetime
+import multiprocessing
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from datetime import datetime, timedelta
 from stores.maktabahalhidayah import MaktabahAlHidayah
 from stores.zakariyya import ZakariyyaBooksScraper
 from stores.ismaeel import IsmaeelScraper
@@ -28,7 +33,11 @@ from stores.safinatulnajat import SafinatUlNajat
 from stores.islamicbookstore import IslamicBookstore
 from stores.jarirbooks import JarirBooks
 from stores.meccabooks import MeccaBooks
-from upload import BookManager, StatusManager
+from upload import BookManager, CrawlQueue, StatusManager
+from book_sink import BookSink
+from http_client import HttpClient
+from response_cache import ResponseCache
+import store_worker
 import enrich_authors
 import logging
 from dotenv import load_dotenv
@@ -68,7 +77,301 @@ STORE_MAPPING = {
 }
 
 
-async def main(store_name=None, no_save=False, enrich=False, ignore_success=False):
+async def finish_store(name, found, error, time_to_crawl, status, sink=None):
+    """
+    Write a crawled store's remaining books and record the outcome in the status doc.
+
+    `found` is how many books the crawl produced and `sink` the BookSink
+    they were streamed into (None when not saving). Returns the error
+    recorded for the store, or None if it succeeded.
+    """
+    new_books = 0
+    if sink is not None:
+        try:
+            # chunks were written while the store crawled; this writes the
+            # last partial one and surfaces any write that failed
+            new_books = await sink.close()
+        except Exception as e:
+            logger.error(f"Critical Error in {name}: {e}", exc_info=True)
+            error = error or e.__str__()
+
+    if error is not None:
+        status.update_status(
+            name,
+            error=error,
+            last_crawled=datetime.now(),
+            time_to_crawl=time_to_crawl.seconds / 60,
+        )
+    else:
+        status.update_status(
+            name,
+            error=None,
+            last_crawled=datetime.now(),
+            time_to_crawl=time_to_crawl.seconds / 60,
+            new_books=new_books,
+            # ensures that some books were actually found
+            last_crawl_success=datetime.now() if found else None,
+        )
+
+    logger.info(f"Finished {name} in {time_to_crawl.seconds/60} minutes. {found} books found.")
+    return error
+
+
+def last_crawl_success(status, name, ignore_success):
+    if ignore_success:
+        return None
+    return status.status.get(name, {}).get("last_crawl_success") or None
+
+
+async def run_store(
+    scraper, db, status, http, running, no_save, ignore_success, cache=None
+):
+    """
+    Crawl one store, streaming its books into the db, and record the outcome in the status doc.
+
+    Errors are logged and stored against the store so the other stores in the
+    run carry on; the error is also returned. `running` holds the names of
+    the stores crawling right now.
+    """
+    start_time = datetime.now()
+    books = None
+    error = None
+    scrape = scraper()
+    scrape.http_client = http
+    scrape.response_cache = cache
+    sink = None if no_save else BookSink(partial(db.upsert_books, scrape.name))
+    scrape.book_sink = sink
+    running.append(scrape.name)
+    status.set_status(", ".join(running))
+    try:
+        books = await scrape.crawl_product_pages(
+            last_crawl_success=last_crawl_success(status, scrape.name, ignore_success)
+        )
+        if sink is not None:
+            # the API-based stores build their own list instead of emitting
+            for book in books or []:
+                sink.add(book)
+                await sink.drain()
+    except asyncio.CancelledError:
+        # e.g. the queue worker lost its lease; keep the books already found
+        if sink is not None:
+            try:
+                await sink.close()
+            except Exception as e:
+                logger.error(f"Could not save the books of cancelled {scrape.name}: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Critical Error in {scrape.name}: {e}", exc_info=True)
+        error = e.__str__()
+    finally:
+        running.remove(scrape.name)
+
+    time_to_crawl = datetime.now() - start_time
+    found = sink.count if sink is not None else len(books or [])
+    error = await finish_store(scrape.name, found, error, time_to_crawl, status, sink)
+    if running:
+        status.set_status(", ".join(running))
+    return error
+
+
+async def run_stores(
+    scrapers, parallel, db, status, http, no_save, ignore_success, cache=None
+):
+    """Crawl the stores in this event loop, up to `parallel` of them at once."""
+    running = []
+    slots = asyncio.Semaphore(max(1, parallel))
+
+    async def run(scraper):
+        async with slots:
+            await run_store(
+                scraper, db, status, http, running, no_save, ignore_success, cache
+            )
+
+    results = await asyncio.gather(
+        *(run(scraper) for scraper in scrapers), return_exceptions=True
+    )
+    for scraper, result in zip(scrapers, results):
+        if isinstance(result, Exception):
+            logger.error(f"Could not run {scraper.__name__}: {result}", exc_info=result)
+
+
+async def run_store_processes(
+    scrapers,
+    processes,
+    db,
+    status,
+    no_save,
+    ignore_success,
+    pool_size,
+    limit_per_host,
+    cache_dir=None,
+):
+    """
+    Crawl each store in one of `processes` worker processes.
+
+    The workers stream books and progress back over a queue; this process
+    does every upload and status update, so only it talks to Mongo. Book
+    chunks are written as they arrive, while the stores are still crawling.
+    """
+    context = multiprocessing.get_context("spawn")
+    loop = asyncio.get_running_loop()
+    names = {scraper: scraper().name for scraper in scrapers}
+    found = dict.fromkeys(names.values(), 0)
+    sinks = {
+        name: None if no_save else BookSink(partial(db.upsert_books, name))
+        for name in names.values()
+    }
+    running = []
+
+    with context.Manager() as manager, ProcessPoolExecutor(
+        processes, mp_context=context
+    ) as pool:
+        queue = manager.Queue()
+        futures = {
+            loop.run_in_executor(
+                pool,
+                store_worker.crawl_store,
+                scraper,
+                queue,
+                last_crawl_success(status, names[scraper], ignore_success),
+                pool_size,
+                limit_per_host,
+                cache_dir,
+            ): names[scraper]
+            for scraper in scrapers
+        }
+        remaining = set(names.values())
+        while remaining:
+            message = await asyncio.to_thread(store_worker.next_message, queue)
+            if message is None:
+                # a worker that died without reporting back (e.g. killed by
+                # the OOM killer) would otherwise leave us waiting forever
+                for future, name in futures.items():
+                    if name in remaining and future.done() and future.exception():
+                        message = ("finished", name, (str(future.exception()), 0))
+                        break
+                else:
+                    continue
+
+            kind, name, payload = message
+            if kind == "started":
+                running.append(name)
+                status.set_status(", ".join(running))
+            elif kind == "books":
+                found[name] += len(payload)
+                if sinks[name] is not None:
+                    for book in payload:
+                        sinks[name].add(book)
+                    await sinks[name].drain()
+            elif kind == "finished":
+                error, seconds = payload
+                remaining.discard(name)
+                if name in running:
+                    running.remove(name)
+                await finish_store(
+                    name,
+                    found[name],
+                    error,
+                    timedelta(seconds=seconds),
+                    status,
+                    sinks[name],
+                )
+                if running:
+                    status.set_status(", ".join(running))
+
+
+async def run_queue_worker(
+    scrapers,
+    run_id,
+    lease_seconds,
+    db,
+    status,
+    http,
+    parallel,
+    no_save,
+    ignore_success,
+    cache=None,
+):
+    """
+    Crawl stores claimed from the shared Mongo queue for `run_id` until none are left.
+
+    Any number of workers, on any machine, can run this for the same run id.
+    Each one adds its stores to the queue (existing jobs are kept), then
+    claims them one at a time per slot and keeps the lease alive while it
+    crawls. Stores whose worker died are picked up again once the lease
+    expires.
+    """
+    queue = CrawlQueue(run_id, lease_seconds)
+    by_name = {scraper().name: scraper for scraper in scrapers}
+    await asyncio.to_thread(queue.enqueue, list(by_name))
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    running = []
+
+    async def crawl_job(job):
+        scraper = by_name.get(job["store"])
+        if scraper is None:
+            error = f"{worker} does not know store {job['store']}"
+            await asyncio.to_thread(queue.finish, job, worker, error)
+            return
+
+        crawl = asyncio.create_task(
+            run_store(
+                scraper, db, status, http, running, no_save, ignore_success, cache
+            )
+        )
+        lost_lease = False
+
+        async def heartbeat():
+            nonlocal lost_lease
+            while True:
+                await asyncio.sleep(lease_seconds / 3)
+                if not await asyncio.to_thread(queue.heartbeat, job, worker):
+                    lost_lease = True
+                    crawl.cancel()
+                    return
+
+        beat = asyncio.create_task(heartbeat())
+        try:
+            error = await crawl
+        except asyncio.CancelledError:
+            if not lost_lease:
+                raise
+            # the job is someone else's now; leave it to them
+            logger.warning(f"Lost the lease on {job['store']}, another worker took it over")
+            return
+        finally:
+            beat.cancel()
+        await asyncio.to_thread(queue.finish, job, worker, error)
+
+    async def slot():
+        while True:
+            job = await asyncio.to_thread(queue.claim, worker)
+            if job is None:
+                if not await asyncio.to_thread(queue.unfinished):
+                    return
+                # the rest is leased to other workers; wait in case one dies
+                await asyncio.sleep(min(30, lease_seconds))
+                continue
+
+            logger.info(f"{worker} claimed {job['store']} (attempt {job['attempts']})")
+            await crawl_job(job)
+
+    await asyncio.gather(*(slot() for _ in range(max(1, parallel))))
+
+
+async def main(
+    store_name=None,
+    no_save=False,
+    enrich=False,
+    ignore_success=False,
+    pool_size=100,
+    limit_per_host=0,
+    parallel=1,
+    processes=1,
+    queue_run=None,
+    lease_seconds=300,
+    response_cache=None,
+):
 
     # await AlBadrBooksScraper().crawl_product_pages()
     # await IsmaeelScraper().crawl_product_pages()
@@ -124,47 +427,45 @@ async def main(store_name=None, no_save=False, enrich=False, ignore_success=Fals
 
     db = BookManager()
     status = StatusManager(scrapers)
+    cache = ResponseCache(response_cache) if response_cache and processes <= 1 else None
 
-    for scraper in scrapers:
-        try:
-            scrape = scraper()
-            status.set_status(scrape.name)
-
-            start_time = datetime.now()
-            last_success = None if ignore_success else (
-                status.status.get(scrape.name, {}).get("last_crawl_success") or None
-            )
-            books = await scrape.crawl_product_pages(last_crawl_success= last_success if not ignore_success else None)
-
-            time_to_crawl = datetime.now() - start_time
-            new_books = 0
-            # ensures that some books were actually found
-            if books:
-                if not no_save:
-                    new_books = db.upload_books(scrape.name, books)
-
-        except Exception as e:
-
-            time_to_crawl = datetime.now() - start_time
-            logger.error(f"Critical Error in {scrape.name}: {e}", exc_info=True)
-            status.update_status(
-                scrape.name,
-                error=e.__str__(),
-                last_crawled=datetime.now(),
-                time_to_crawl=time_to_crawl.seconds / 60,
+    if queue_run:
+        async with HttpClient(limit=pool_size, limit_per_host=limit_per_host) as http:
+            await run_queue_worker(
+                scrapers,
+                queue_run,
+                lease_seconds,
+                db,
+                status,
+                http,
+                parallel,
+                no_save,
+                ignore_success,
+                cache,
             )
-
-        else:
-            status.update_status(
-                scrape.name,
-                error=None,
-                last_crawled=datetime.now(),
-                time_to_crawl=time_to_crawl.seconds / 60,
-                new_books=new_books,
-                last_crawl_success=datetime.now() if books else None,
+    elif processes > 1:
+        await run_store_processes(
+            scrapers,
+            processes,
+            db,
+            status,
+            no_save,
+            ignore_success,
+            pool_size,
+            limit_per_host,
+            response_cache,
+        )
+    else:
+        # one connection pool for the whole run, so DNS answers and keep-alive
+        # connections carry over between stores
+        async with HttpClient(limit=pool_size, limit_per_host=limit_per_host) as http:
+            await run_stores(
+                scrapers, parallel, db, status, http, no_save, ignore_success, cache
             )
 
-        logger.info(f"Finished {scrape.name} in {time_to_crawl.seconds/60} minutes. {len(books) if books else 0} books found.")
+    if cache is not None:
+        cache.log_stats()
+        cache.close()
 
     if not no_save and enrich:
         try:
@@ -200,8 +501,63 @@ if __name__ == "__main__":
         action="store_true",
         help="Do not pass last crawl success (full crawl for scrapers that support incremental updates)",
     )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=100,
+        help="Maximum open HTTP connections across all stores",
+    )
+    parser.add_argument(
+        "--limit-per-host",
+        type=int,
+        default=0,
+        help="Maximum open HTTP connections per host (0 for no limit)",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="Number of stores to crawl at the same time",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Crawl stores in this many worker processes, one store per process at a time",
+    )
+    parser.add_argument(
+        "--queue",
+        type=str,
+        metavar="RUN_ID",
+        help="Work through a crawl run shared with other workers via MongoDB",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=300,
+        help="How long a claimed store stays leased without a heartbeat",
+    )
+    parser.add_argument(
+        "--response-cache",
+        nargs="?",
+        const="saved_progress/response_cache",
+        metavar="DIR",
+        help="Serve recently fetched pages from an on-disk cache (for development runs)",
+    )
     args = parser.parse_args()
 
     asyncio.run(
-        main(args.store, args.no_save, args.enrich, args.ignore_success)
+        main(
+            args.store,
+            args.no_save,
+            args.enrich,
+            args.ignore_success,
+            args.pool_size,
+            args.limit_per_host,
+            args.parallel,
+            args.processes,
+            args.queue,
+            args.lease_seconds,
+            args.response_cache,
+        )
     )
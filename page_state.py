@@ -0,0 +1,55 @@
+import json
+import sqlite3
+
+
+class PageState:
+    """
+    What the last crawls of one store learned about each product page.
+
+    Each URL maps to a small dict (e.g. the page's ETag/Last-Modified
+    validators and the book it produced), kept in an SQLite file so a
+    later crawl can look pages up without loading the whole store.
+    Writes are committed in batches of `commit_every` and on `close`.
+    """
+
+    def __init__(self, path: str, commit_every: int = 500):
+        self.path = path
+        self.commit_every = commit_every
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, state TEXT NOT NULL)"
+        )
+        self._pending = 0
+
+    def get(self, url: str) -> dict | None:
+        row = self._db.execute(
+            "SELECT state FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, url: str, state: dict) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO pages (url, state) VALUES (?, ?)",
+            (url, json.dumps(state, ensure_ascii=False)),
+        )
+        self._written()
+
+    def delete(self, url: str) -> None:
+        self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+        self._written()
+
+    def _written(self) -> None:
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self._db.commit()
+            self._pending = 0
+
+    def urls(self) -> list[str]:
+        return [url for (url,) in self._db.execute("SELECT url FROM pages")]
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
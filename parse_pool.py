@@ -0,0 +1,29 @@
+"""
+Picklable entry point for parsing pages in a process pool.
+
+A scraper with `parse_workers > 0` sends `(scraper class, method name,
+response bytes, url, charset)` to a worker process instead of parsing on
+the event loop. Each worker builds one instance per scraper class and
+reuses it, so the store's strainer, regexes and extraction code run exactly
+as they would in-process.
+
+Only the class crosses over: the worker's instance is built with no
+arguments, so anything set on the crawling instance after construction is
+not seen, and counters bumped while parsing stay in the worker. The one
+piece of crawl state parsing needs, the charset the crawling instance
+worked out for the page's host (partly from response headers the worker
+never sees), is passed along with each page.
+"""
+
+from urllib.parse import urlparse
+
+_scrapers = {}
+
+
+def call(scraper_cls, method: str, response: bytes, url: str, charset: str | None = None):
+    scraper = _scrapers.get(scraper_cls)
+    if scraper is None:
+        scraper = _scrapers[scraper_cls] = scraper_cls()
+    if charset:
+        scraper._charsets[urlparse(url).hostname] = charset
+    return getattr(scraper, method)(response, url)
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+logger = logging.getLogger("scraper")
+
+
+class ResponseCache:
+    """
+    Opt-in on-disk cache of page bodies, for development runs and re-crawls.
+
+    Bodies are zlib-compressed and stored once per content hash, so pages
+    with identical bodies share a file; an SQLite index maps each URL to its
+    body and records when it was fetched and last used. `get` only returns
+    entries younger than the caller's TTL. Once the compressed bodies take
+    more than `max_bytes`, the least recently used URLs are evicted until
+    they fit in 90% of it.
+
+    `get` and `put` block on disk I/O; the crawl calls them through
+    asyncio.to_thread, so they may run on several threads at once and take
+    a lock around the index.
+    """
+
+    def __init__(
+        self, directory: str = "saved_progress/response_cache", max_bytes: int = 2**31
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        os.makedirs(directory, exist_ok=True)
+        # several store workers may share the directory
+        self._db = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), timeout=30, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                raw_size INTEGER NOT NULL,
+                fetched REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS lru ON responses (last_used)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS bodies ON responses (digest)")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.commit()
+        # each body counts once, however many URLs share it
+        self._total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM responses)"
+        ).fetchone()[0]
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, url: str, ttl: float) -> bytes | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest, raw_size, fetched FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or row[2] < time.time() - ttl:
+                self.stats["misses"] += 1
+                return None
+        digest, raw_size, _ = row
+        try:
+            with open(self._path(digest), "rb") as file:
+                body = zlib.decompress(file.read())
+        except (OSError, zlib.error):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url)
+            )
+            self._db.commit()
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += raw_size
+        return body
+
+    def put(self, url: str, body: bytes) -> None:
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            compressed = None
+            if not os.path.exists(path):
+                compressed = zlib.compress(body)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as file:
+                    file.write(compressed)
+                os.replace(tmp, path)
+                self._total += len(compressed)
+
+            now = time.time()
+            size = len(compressed) if compressed is not None else os.path.getsize(path)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (url, digest, size, len(body), now, now),
+            )
+            self._db.commit()
+            self.stats["stored"] += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        if self._total <= self.max_bytes:
+            return
+
+        for url, digest, size in self._db.execute(
+            "SELECT url, digest, size FROM responses ORDER BY last_used"
+        ).fetchall():
+            self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            shared = self._db.execute(
+                "SELECT 1 FROM responses WHERE digest = ? LIMIT 1", (digest,)
+            ).fetchone()
+            if not shared:
+                try:
+                    os.remove(self._path(digest))
+                except FileNotFoundError:
+                    pass
+                self._total -= size
+            self.stats["evicted"] += 1
+            if self._total <= self.max_bytes * 0.9:
+                break
+        self._db.commit()
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Response cache: {self.stats['hits']} hits, {self.stats['misses']} misses, "
+            f"{self.stats['bytes_saved'] / 2**20:.1f} MB not downloaded"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -7,16 +7,39 @@ import json
 import time
 from bs4 import BeautifulSoup, SoupStrainer
 import csv
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse
 import logging
 import datetime
-import pickle
+import codecs
+import email.utils
+import hashlib
+import inspect
+import os
+import random
+import re
+from collections import deque
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from frontier import CrawlFrontier
+from visited_set import CompactVisitedSet
+from link_harvester import absolute_links, harvest_links
+from sitemap import SitemapReader
+from canonical_url import canonical_url
+import parse_pool
+from http_client import HttpClient
+from page_state import PageState
+from crawl_journal import CrawlJournal
+import content_encoding
 
 
 class ScraperError(Exception):
     pass
 
 
+class HostDownError(ScraperError):
+    """A host's circuit breaker gave up on it; the crawl can't finish."""
+
+
 class TestError(Exception):
     pass
 
@@ -56,6 +79,385 @@ import aiohttp
 from aiohttp import ClientSession
 
 
+class HrefRecorder:
+    """
+    Wraps a SoupStrainer and records the href of every <a> it is asked about.
+
+    BeautifulSoup only consults `parse_only` for tags outside an already
+    matched subtree, so the recorded hrefs plus the anchors that end up in the
+    tree cover every link on the page. That lets a product page be parsed
+    once with the store's strainer instead of a second time for its links.
+    """
+
+    def __init__(self, strainer: SoupStrainer):
+        self.strainer = strainer
+        self.hrefs = []
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        if name == "a" and attrs and attrs.get("href"):
+            self.hrefs.append(attrs["href"])
+        return self.strainer.allow_tag_creation(nsprefix, name, attrs)
+
+    def __getattr__(self, name):
+        return getattr(self.strainer, name)
+
+
+# fetch_page returns this instead of a body when the server answered 304
+NOT_MODIFIED = object()
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?\s*([\w:.-]+)""", re.IGNORECASE)
+
+CONCURRENCY_LIMITS_FILE = "saved_progress/concurrency_limits.json"
+
+
+def load_concurrency_limits() -> dict[str, float]:
+    try:
+        with open(CONCURRENCY_LIMITS_FILE) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_concurrency_limits(limits: dict[str, float]) -> None:
+    """Merge `limits` into the saved per-host limits, replacing the file atomically."""
+    merged = load_concurrency_limits()
+    merged.update(limits)
+    # per-process temp file, since store workers may save at the same time
+    tmp = f"{CONCURRENCY_LIMITS_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as file:
+        json.dump(merged, file, indent=4, sort_keys=True)
+    os.replace(tmp, CONCURRENCY_LIMITS_FILE)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the number of concurrent fetches to one host.
+
+    Every successful fetch raises the limit by `1 / limit` (about +1 per
+    round of requests) as long as its latency stays within
+    `latency_tolerance` times the running average. A 429/503, a timeout or a
+    latency spike cuts the limit by `decrease`. Failures that land within one
+    average latency of the last cut count as the same congestion event, so a
+    burst of errors from requests that were already in flight only cuts once.
+    """
+
+    def __init__(
+        self,
+        initial: float,
+        minimum: int = 1,
+        maximum: int = 32,
+        decrease: float = 0.5,
+        latency_tolerance: float = 3.0,
+    ):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.avg_latency = None
+        self.in_flight = 0
+        self._last_cut = 0.0
+        self._slots = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
+
+    def _notify(self) -> None:
+        # called from sync code; wake waiters on the next loop iteration
+        async def notify():
+            async with self._slots:
+                self._slots.notify_all()
+
+        asyncio.ensure_future(notify())
+
+    def record_success(self, latency: float) -> None:
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        elif latency > self.avg_latency * self.latency_tolerance:
+            self.record_throttle()
+            return
+
+        self.avg_latency = 0.9 * self.avg_latency + 0.1 * latency
+        old_limit = int(self.limit)
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        if int(self.limit) > old_limit:
+            self._notify()
+
+    def record_throttle(self) -> None:
+        now = time.monotonic()
+        if now - self._last_cut < (self.avg_latency or 1.0):
+            return
+        self._last_cut = now
+        self.limit = max(self.minimum, self.limit * self.decrease)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    Paces requests to one host at `rate` requests per second.
+
+    Up to `burst` requests may go out back to back; after that `acquire`
+    waits for the next token. With `rate=None` requests are not paced until
+    the host first throttles us; the bucket then starts from the rate we were
+    sending at over the last `window` seconds, or `start_rate` if that is
+    higher, and has no ceiling. A throttled response halves the rate (down
+    to `min_rate`) and, when the server sent `Retry-After`, holds this host's
+    requests until then. Each success raises the rate by 1%, so it climbs
+    back over about a hundred requests instead of jumping straight back into
+    the limit.
+    """
+
+    def __init__(
+        self, rate: float = None, burst: float = None, min_rate: float = 0.2, window: float = 10
+    ):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.window = window
+        self.rate = None
+        self.burst = burst
+        self.tokens = 0.0
+        self.throttled = 0
+        self._sent = deque()  # send times over the last `window` seconds while unpaced
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_cut = 0.0
+        if rate is not None:
+            self._start(rate)
+
+    def _start(self, rate: float) -> None:
+        self.rate = max(self.min_rate, rate)
+        if self.burst is None:
+            self.burst = max(1.0, self.rate)
+        self.tokens = self.burst
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            if self.rate is None:
+                self._sent.append(now)
+                while self._sent[0] < now - self.window:
+                    self._sent.popleft()
+                return
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def record_success(self) -> None:
+        if self.rate is not None:
+            self.rate *= 1.01
+            if self.max_rate is not None:
+                self.rate = min(self.max_rate, self.rate)
+
+    def _observed_rate(self, now: float) -> float:
+        if not self._sent:
+            return 0.0
+        return len(self._sent) / max(1.0, now - self._sent[0])
+
+    def record_throttle(self, retry_after: float | None = None, start_rate: float = 0.0) -> None:
+        """
+        The host said slow down (429/503, Retry-After).
+
+        `start_rate` is a floor for the rate an unpaced bucket starts from,
+        e.g. the host's concurrency limit, so a throttle after a quiet spell
+        doesn't drop it to `min_rate`.
+        """
+        now = time.monotonic()
+        self.throttled += 1
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        if self.rate is None:
+            self._start(max(self._observed_rate(now), start_rate))
+            self._updated = now
+            self._sent.clear()
+        # responses to requests sent before the last cut say nothing new
+        elif now - self._last_cut < 1 / self.rate:
+            return
+        self._last_cut = now
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RetryPolicy:
+    """
+    Which fetch failures are retried, how long to wait and how many retries a crawl may spend.
+
+    Responses with a status in `retry_statuses` and exceptions matching
+    `retry_exceptions` are transient; anything else (a 404, a redirect, a
+    body that cannot be decoded) fails the page straight away. Each URL gets
+    at most `max_attempts` tries, waiting a random "full jitter" delay
+    between 0 and `base_delay * 2**attempt` (capped at `max_delay`) unless
+    the server sent Retry-After. Retries also come out of a budget of
+    `min_budget` plus `budget_ratio` per URL fetched, so when a large share
+    of requests fail the crawl gives those pages up instead of multiplying
+    its load on the server.
+    """
+
+    retry_statuses = {408, 425, 429, 500, 502, 503, 504}
+    retry_exceptions = (
+        asyncio.TimeoutError,
+        aiohttp.ClientConnectionError,
+        aiohttp.ClientPayloadError,
+    )
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget_ratio: float = 0.2,
+        min_budget: int = 10,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def is_transient(self, failure: int | BaseException) -> bool:
+        if isinstance(failure, int):
+            return failure in self.retry_statuses
+        return isinstance(failure, self.retry_exceptions)
+
+    def backoff(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def take_retry(self) -> bool:
+        """Spend one retry from the budget, or return False if none are left."""
+        if self.retries >= self.min_budget + self.budget_ratio * self.requests:
+            self.exhausted += 1
+            return False
+        self.retries += 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Holds back requests to a host that keeps failing, and probes it until it recovers.
+
+    After `failure_threshold` transient failures in a row the circuit opens:
+    `acquire` makes this host's requests wait instead of adding load to a
+    struggling server. After `reset_timeout` seconds one request is let
+    through as a probe (half-open). If it succeeds the circuit closes and
+    the waiting requests go ahead; if it fails the circuit opens again for
+    twice as long, up to `max_reset_timeout`. Once `max_failed_probes`
+    probes in a row have failed the host is treated as down and `acquire`
+    raises HostDownError, which fails the crawl.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        max_reset_timeout: float = 60.0,
+        max_failed_probes: int = 5,
+        probe_timeout: float = 60.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.max_failed_probes = max_failed_probes
+        self.probe_timeout = probe_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.failed_probes = 0
+        self.trips = 0
+        self._timeout = reset_timeout
+        self._retry_at = 0.0
+        self._changed = asyncio.Event()
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def acquire(self) -> None:
+        while self.state != "closed":
+            if self.failed_probes >= self.max_failed_probes:
+                raise HostDownError(
+                    f"Host still failing after {self.failed_probes} recovery probes"
+                )
+            if self.state == "open":
+                wait = self._retry_at - time.monotonic()
+                if wait <= 0:
+                    # this request is the probe
+                    self._set_state("half_open")
+                    return
+                await asyncio.sleep(wait)
+                continue
+            # a probe is out; wait for its outcome
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), self.probe_timeout)
+            except asyncio.TimeoutError:
+                if self._changed is changed:
+                    # the probe never reported back (e.g. it was cancelled)
+                    return
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.failed_probes = 0
+        self._timeout = self.reset_timeout
+        if self.state != "closed":
+            self._set_state("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open":
+            self.failed_probes += 1
+            self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+        elif self.state == "open" or self.failures < self.failure_threshold:
+            return
+        self.trips += 1
+        self._retry_at = time.monotonic() + self._timeout
+        self._set_state("open")
+
+
 class AbstractBookScraper(ABC):
     def __init__(self, base_url, name, convert_rate=1):
         # ensure that the base url ends with a slash
@@ -65,17 +467,26 @@ class AbstractBookScraper(ABC):
         self.base_url = base_url
         self.name = name
         self.logger = logger
-        self.urls_to_visit = set()
-        self.visited_urls = set()
+        self.frontier = CrawlFrontier()
+        # link depth of queued pages, for url_priority
+        self._link_depth = {}
         self.all_books = []
+        # when set (a BookSink), books go to it as they are found instead of
+        # piling up in all_books until the crawl ends
+        self.book_sink = None
+        self.books_found = 0
         self.count = 0
         self.batch_size = 5
+        # ceiling for the adaptive per-host concurrency limit; batch_size is
+        # only the starting point when no limit was learned on a previous run
+        self.max_concurrency = 32
+        self._concurrency = {}
         self.strainer = SoupStrainer()
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
             "Accept-Language": "en-US,en;q=0.9",
-            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Encoding": content_encoding.ACCEPT_ENCODING,
             "DNT": "1",
             "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1",
@@ -85,21 +496,155 @@ class AbstractBookScraper(ABC):
             "Sec-Fetch-User": "?1",
             "Cache-Control": "max-age=0",
         }
-        self.batch_delay = 0  # Delay between batches in seconds
-
-        self.error_count = 0
-        self.ERROR_THRESHOLD = 20
-
-        # Global pause gate: when cleared, all fetches wait until it's set again.
-        # Used to back off every concurrent request on 429/503 responses.
-        self._resume_event = asyncio.Event()
-        self._resume_event.set()
-        self._pause_lock = asyncio.Lock()
+        self.batch_delay = 0  # Pause after each fetch before its host slot is freed, in seconds
+
+        # transient failures are retried per retry_policy; a host that keeps
+        # failing trips its circuit breaker instead of failing the whole crawl
+        self.retry_policy = RetryPolicy()
+        self._breakers = {}
+
+        # request rate cap per host (None: unpaced until the host throttles
+        # us); a 429/503 slows only that host down instead of every fetch
+        self.requests_per_second = None
+        self._rate_limits = {}
+
+        # URL canonicalization for discovered links. keep_query_params is a
+        # whitelist (None keeps every param not in drop_query_params);
+        # trailing_slash=True/False adds/strips it, None leaves paths alone.
+        self.keep_query_params = None
+        self.drop_query_params = set()
+        self.trailing_slash = None
+        self.canonical_dedupes = 0
+        # raw links already seen, and canonical URLs first queued through a
+        # variant; reset per crawl and the same kind of set as the visited URLs
+        self._url_variants = set()
+        self._queued_via_variant = set()
+        # None remembers visited URLs exactly; a false-positive rate (e.g.
+        # 1e-4) keeps them in a CompactVisitedSet instead, for stores whose
+        # crawls visit so many URLs that the sets take hundreds of MB
+        self.visited_error_rate = None
+
+        # bytes (or a tuple of alternatives) that every real product page of
+        # this store contains; pages without them skip book extraction and,
+        # when crawling links, only get their anchors parsed
+        self.product_fingerprint = None
+        self.fingerprint_skips = 0
+
+        # > 0 parses pages in a process pool of this size so the event loop
+        # keeps fetching while CPU-heavy pages are parsed
+        self.parse_workers = 0
+        self._parse_pool = None
+
+        # remember each product page's ETag/Last-Modified and the book it
+        # produced, and ask for it conditionally next time; a 304 re-emits
+        # the stored book without downloading or parsing the page
+        self.conditional_requests = True
+        self.not_modified = 0
+        # also skip parsing when a product page's body hashes the same as
+        # the one that produced the stored book
+        self.skip_unchanged_bodies = True
+        self.unchanged_bodies = 0
+        self._extractor_version = None
+        self._page_state = None
+        self._validators = {}
+
+        # progress is journaled while crawling; a crawl that died less than
+        # resume_max_age seconds ago picks up where it stopped
+        self.resume_max_age = 24 * 60 * 60
+        self._journal = None
+
+        # bytes of page bodies as received and after decoding their
+        # Content-Encoding, to see what compression saves per store
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        # product pages can stop downloading early: once every stop marker
+        # (bytes, or a tuple of them) has been read, or after max_body_bytes
+        # decoded bytes. Only for stores whose extractor needs no more and
+        # that don't need the links further down the page.
+        self.body_stop_marker = None
+        self.max_body_bytes = None
+        self.truncated_bodies = 0
+        # each host's declared charset, handed to BeautifulSoup so it skips
+        # encoding detection; decode_seconds is the time spent undoing
+        # Content-Encoding and working out charsets
+        self._charsets = {}
+        self._header_charsets = {}
+        self.decode_seconds = 0.0
+
+        # opt-in ResponseCache (main.py --response-cache); pages fetched less
+        # than cache_ttl seconds ago are read from disk instead
+        self.response_cache = None
+        self.cache_ttl = 24 * 60 * 60
+
+        # run-scoped HttpClient injected by main.py; None opens a private
+        # session per crawl
+        self.http_client = None
 
         # converting from GBP to USD
         self.convert_rate = convert_rate
         self.test_urls = []  # urls that should cover all possible cases
 
+    @property
+    def visited_urls(self) -> set[str]:
+        return self.frontier.visited
+
+    def host_concurrency(self, url) -> AdaptiveConcurrency:
+        host = urlparse(url).hostname
+        if host not in self._concurrency:
+            initial = load_concurrency_limits().get(host, self.batch_size)
+            self._concurrency[host] = AdaptiveConcurrency(
+                initial, maximum=max(self.max_concurrency, self.batch_size)
+            )
+        return self._concurrency[host]
+
+    def host_rate_limit(self, url) -> TokenBucket:
+        host = urlparse(url).hostname
+        if host not in self._rate_limits:
+            self._rate_limits[host] = TokenBucket(self.requests_per_second)
+        return self._rate_limits[host]
+
+    def host_breaker(self, url) -> CircuitBreaker:
+        host = urlparse(url).hostname
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker()
+        return self._breakers[host]
+
+    @property
+    def page_state(self) -> PageState:
+        if self._page_state is None:
+            self._page_state = PageState(f"saved_progress/page_state_{self.name}.sqlite")
+        return self._page_state
+
+    @property
+    def extractor_version(self) -> str:
+        """
+        Hash of the code that turns this store's pages into books.
+
+        Stored books are only reused by a crawl running the same code, so a
+        fixed extractor re-parses every page once.
+        """
+        if self._extractor_version is None:
+            digest = hashlib.blake2b(digest_size=8)
+            for cls in type(self).__mro__:
+                try:
+                    path = inspect.getsourcefile(cls)
+                except TypeError:
+                    continue
+                if path:
+                    with open(path, "rb") as file:
+                        digest.update(file.read())
+            self._extractor_version = digest.hexdigest()
+        return self._extractor_version
+
+    @asynccontextmanager
+    async def client_session(self):
+        """Session for a crawl: the run's shared one if injected, else a private one."""
+        if self.http_client is not None:
+            yield self.http_client.session
+            return
+        async with HttpClient() as client:
+            yield client.session
+
     @abstractmethod
     def extract_book_info(self, soup: BeautifulSoup, url) -> Book | None:
         pass
@@ -114,6 +659,75 @@ class AbstractBookScraper(ABC):
     def url_in_domain(self, url):
         return url.startswith(self.base_url)
 
+    def canonicalize_url(self, url) -> str:
+        return canonical_url(
+            url,
+            keep_params=self.keep_query_params,
+            drop_params=self.drop_query_params,
+            trailing_slash=self.trailing_slash,
+        )
+
+    def url_priority_hint(self, url) -> float:
+        """Per-store adjustment to `url_priority`; negative values crawl `url` sooner."""
+        return 0
+
+    def url_priority(self, url, depth: int) -> float:
+        """
+        Crawl order of a queued URL, lowest first.
+
+        Product pages go before everything else and other pages follow by
+        link depth, so books arrive early and a crawl cut short still has
+        most of them, while discovery carries on behind.
+        """
+        score = 0 if self.is_product_url(url) else 1 + depth
+        return score + self.url_priority_hint(url)
+
+    def _add_to_frontier(self, url, depth: int = 0) -> bool:
+        if not self.frontier.add(url, self.url_priority(url, depth)):
+            return False
+        self._link_depth[url] = depth
+        if self._journal is not None:
+            self._journal.queued(url)
+        return True
+
+    def queue_link(self, url, depth: int = 0) -> bool:
+        """
+        Canonicalize a discovered link and add it to the frontier.
+
+        `depth` is the number of links followed from the start pages.
+
+        Counts every distinct URL variant that collapsed onto a page that is
+        already queued or visited in `canonical_dedupes`, i.e. a fetch the old
+        raw-URL frontier would have made.
+        """
+        canonical = self.canonicalize_url(url)
+        if not self.url_in_domain(canonical) or self.ignore_url(canonical):
+            return False
+
+        if canonical == url:
+            if self._add_to_frontier(canonical, depth):
+                return True
+            # the first time a page queued via a variant is linked to directly
+            if canonical in self._queued_via_variant and canonical not in self._url_variants:
+                self._url_variants.add(canonical)
+                self.canonical_dedupes += 1
+            return False
+
+        if url in self._url_variants:
+            return False
+        self._url_variants.add(url)
+        if self._add_to_frontier(canonical, depth):
+            self._queued_via_variant.add(canonical)
+            return True
+        self.canonical_dedupes += 1
+        return False
+
+    def _new_visited_set(self):
+        """An empty set for remembering URLs, compact if `visited_error_rate` is set."""
+        if self.visited_error_rate:
+            return CompactVisitedSet(error_rate=self.visited_error_rate)
+        return set()
+
     def write_to_csv(self, book_list):
         with open("csvs/" + self.name, "w", newline="", encoding="utf-8") as file:
             writer = csv.DictWriter(
@@ -150,116 +764,189 @@ class AbstractBookScraper(ABC):
     # in a method so that it can be overridden by some scrapers
     def add_book(self, book_info: Book) -> None:
         if book_info:
-            self.all_books.append(book_info.model_dump(exclude_none=True))
-
-    async def _pause_all(self, delay: int, reason: str) -> None:
-        """Pause every concurrent fetch for `delay` seconds.
-
-        Only the first caller actually sleeps; others awaiting the event
-        will resume together once the pause is lifted.
-        """
-        if self._pause_lock.locked():
-            # Another task is already handling the global backoff; just wait.
-            await self._resume_event.wait()
-            return
+            self._emit_book(book_info.model_dump(exclude_none=True))
 
-        async with self._pause_lock:
-            self._resume_event.clear()
-            self.logger.warning(
-                f"Pausing all fetches for {delay}s due to {reason}"
-            )
-            try:
-                await asyncio.sleep(delay)
-            finally:
-                self._resume_event.set()
-                self.logger.info("Resuming fetches after global backoff")
+    def _emit_book(self, book: dict) -> None:
+        self.books_found += 1
+        if self.book_sink is not None:
+            self.book_sink.add(book)
+        else:
+            self.all_books.append(book)
 
     async def fetch_page(
-        self,
-        session: ClientSession,
-        url: str,
-        referer: str = None,
-        attempt: int = 1,
-        max_attempts: int = 4,
+        self, session: ClientSession, url: str, referer: str = None
     ) -> tuple[str, str]:
-        # Wait if a global backoff is in progress (e.g. another task hit 429).
-        await self._resume_event.wait()
-
-        logger.info(f"Fetching page: {url}")
+        if self.response_cache is not None:
+            content = await asyncio.to_thread(self.response_cache.get, url, self.cache_ttl)
+            if content is not None:
+                return url, content
 
         headers = self.headers.copy()
         if referer:
             headers["Referer"] = referer
             headers["Sec-Fetch-Site"] = "same-origin"
 
-        try:
-            async with session.get(url, headers=headers, timeout=30) as response:
-                if response.status == 200:
-                    content = await response.content.read()
-                    return url, content
-
-                self.logger.error(
-                    f"Failed to retrieve the page at {url}. Status code: {response.status}"
-                )
-
-                # transient errors: pause ALL concurrent fetches and retry
-                if response.status in [503, 429, 301]:
-                    self.error_count += 1
-                    retry_after = response.headers.get("Retry-After")
-                    try:
-                        delay = int(retry_after) + 1 if retry_after else 2 ** attempt
-                    except (TypeError, ValueError):
-                        delay = 2 ** attempt
-
-                    if attempt >= max_attempts:
-                        raise ScraperError(
-                            f"{response.status} error on {url} after {attempt} attempts"
+        state = self._reusable_state(url)
+        if state:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        policy = self.retry_policy
+        policy.requests += 1
+        breaker = self.host_breaker(url)
+        rate_limit = self.host_rate_limit(url)
+        concurrency = self.host_concurrency(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            await breaker.acquire()
+            await rate_limit.acquire()
+            logger.info(f"Fetching page: {url}")
+
+            retry_after = None
+            try:
+                request_start = time.monotonic()
+                # decoded by us, so the compressed size can be counted
+                async with session.get(
+                    url, headers=headers, timeout=30, auto_decompress=False
+                ) as response:
+                    if response.status == 304 and state:
+                        breaker.record_success()
+                        concurrency.record_success(time.monotonic() - request_start)
+                        rate_limit.record_success()
+                        self.not_modified += 1
+                        return url, NOT_MODIFIED
+
+                    if response.status == 200:
+                        if response.charset:
+                            self._header_charsets[urlparse(url).hostname] = response.charset
+                        received, content, complete = await self._read_body(response, url)
+                        self.bytes_received += received
+                        self.bytes_decoded += len(content)
+                        breaker.record_success()
+                        concurrency.record_success(time.monotonic() - request_start)
+                        rate_limit.record_success()
+                        # a cut-off page must not be served later as the whole page
+                        if self.response_cache is not None and complete:
+                            await asyncio.to_thread(self.response_cache.put, url, content)
+                        if self.conditional_requests:
+                            self._validators[url] = {
+                                "etag": response.headers.get("ETag"),
+                                "last_modified": response.headers.get("Last-Modified"),
+                            }
+                        return url, content
+
+                    failure = f"HTTP {response.status}"
+                    # throttled: slow this host down; other hosts keep going
+                    if response.status in (429, 503):
+                        concurrency.record_throttle()
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        rate_limit.record_throttle(retry_after, start_rate=concurrency.limit)
+                    # the host is up, just busy or refusing this page
+                    if response.status < 500:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                    if response.status in (404, 410):
+                        # gone; don't bring it back on the next crawl
+                        self._forget_page(url)
+                    if not policy.is_transient(response.status):
+                        self.logger.error(
+                            f"Failed to retrieve the page at {url}. Status code: {response.status}"
                         )
-
-                    await self._pause_all(delay, f"HTTP {response.status} on {url}")
-                    return await self.fetch_page(
-                        session, url, referer, attempt + 1, max_attempts
-                    )
-
-        except (asyncio.TimeoutError, aiohttp.ServerTimeoutError) as e:
-            self.error_count += 1
-            self.logger.error(
-                f"Timeout on {url} (attempt {attempt}/{max_attempts}): {e}"
+                        return url, None
+            except Exception as e:
+                if not policy.is_transient(e):
+                    self.logger.error(f"Unexpected error on {url}: {e}")
+                    return url, None
+                failure = f"{type(e).__name__} {e}".strip()
+                # a timeout or dropped connection isn't a request to slow
+                # down: the breaker and the concurrency limit handle it
+                breaker.record_failure()
+                concurrency.record_throttle()
+
+            if attempt >= policy.max_attempts or not policy.take_retry():
+                self.logger.error(f"Giving up on {url} after {attempt} attempts: {failure}")
+                return url, None
+            delay = policy.backoff(attempt, retry_after)
+            self.logger.warning(
+                f"{failure} on {url}, retrying in {delay:.1f}s "
+                f"(attempt {attempt + 1}/{policy.max_attempts})"
             )
-            if attempt < max_attempts:
-                delay = 2 ** attempt
-                self.logger.info(
-                    f"Retrying {url} in {delay} seconds (attempt {attempt + 1}/{max_attempts})"
-                )
-                await asyncio.sleep(delay)
-                if self.error_count > self.ERROR_THRESHOLD:
-                    raise ScraperError(f"Error threshold reached for {url}")
-                return await self.fetch_page(
-                    session, url, referer, attempt + 1, max_attempts
-                )
-            self.logger.error(f"Giving up on {url} after {attempt} timeout attempts")
-        except ScraperError:
-            raise
-        except Exception as e:
-            self.logger.error(f"Unexpected error on {url}: {e}")
-            self.error_count += 1
-
-        if self.error_count > self.ERROR_THRESHOLD:
-            raise ScraperError(f"Error threshold reached for {url}")
-
-        return url, None
+            await asyncio.sleep(delay)
 
-    def get_cache(self, use_cached_links) -> None:
-        with open(f"saved_progress/urls_to_visit_{use_cached_links}.txt", "r") as file:
-            self.urls_to_visit = file.readlines()
-            self.urls_to_visit = set([url.strip() for url in self.urls_to_visit])
+    async def _read_body(self, response, url) -> tuple[int, bytes, bool]:
+        """
+        Read and decode a response body.
 
-        with open(f"saved_progress/visited_urls_{use_cached_links}.txt", "r") as file:
-            self.visited_urls = file.readlines()
-            self.visited_urls = set([url.strip() for url in self.visited_urls])
+        Returns (bytes received, decoded body, whether the body is complete).
 
-        with open(f"saved_progress/all_books_{use_cached_links}", "rb") as file:
-            self.all_books = pickle.load(file)
+        Product pages of stores with a `body_stop_marker` or `max_body_bytes`
+        are read in chunks, and reading stops as soon as all the markers
+        have been seen or the cap is reached. The connection is then closed
+        instead of downloading the rest of the page.
+        """
+        encoding = response.headers.get("Content-Encoding")
+        markers = self.body_stop_marker
+        if (markers is None and self.max_body_bytes is None) or not self.is_product_url(url):
+            raw = await response.content.read()
+            start = time.perf_counter()
+            content = content_encoding.decode(raw, encoding)
+            self.decode_seconds += time.perf_counter() - start
+            return len(raw), content, True
+
+        pending = [markers] if isinstance(markers, bytes) else list(markers or ())
+        decoder = content_encoding.StreamDecoder(encoding)
+        body = bytearray()
+        received = 0
+        async for chunk in response.content.iter_chunked(16 * 1024):
+            received += len(chunk)
+            searched = len(body)
+            start = time.perf_counter()
+            body += decoder.decompress(chunk)
+            self.decode_seconds += time.perf_counter() - start
+            # a marker may straddle two chunks
+            pending = [
+                marker
+                for marker in pending
+                if body.find(marker, max(0, searched - len(marker) + 1)) < 0
+            ]
+            if markers is not None and not pending:
+                break
+            if self.max_body_bytes is not None and len(body) >= self.max_body_bytes:
+                del body[self.max_body_bytes :]
+                break
+        else:
+            body += decoder.flush()
+            return received, bytes(body), True
+
+        self.truncated_bodies += 1
+        response.close()
+        return received, bytes(body), False
+
+    def _open_journal(self) -> tuple[list[str], set[str], list[dict]] | None:
+        """Start journaling this crawl; returns the interrupted crawl's progress, if any."""
+        self._journal = CrawlJournal(f"saved_progress/journal_{self.name}.jsonl")
+        resumed = self._journal.load(self.resume_max_age)
+        if resumed is None:
+            self._journal.remove()
+            return None
+
+        pending, done, books = resumed
+        for book in books:
+            self._emit_book(book)
+        self.logger.info(
+            f"{self.name}: resuming an interrupted crawl, {len(done)} pages done "
+            f"({len(books)} books), {len(pending)} queued"
+        )
+        return resumed
+
+    def _close_journal(self) -> None:
+        # only reached when the crawl finished; after a crash the journal stays
+        self._journal.remove()
+        self._journal = None
 
     def test_base_url(self):
         response = requests.get(self.base_url, headers=self.headers, timeout=10)
@@ -271,127 +958,536 @@ class AbstractBookScraper(ABC):
             )
 
     async def crawl_product_pages(
-        self, last_crawl_success=None, initial_urls=list(), use_cached_links=None
+        self, last_crawl_success=None, initial_urls=list()
     ) -> list[dict]:
         self.logger.info(f"Crawling {self.name}")
 
         start = time.time()
-        if use_cached_links:
-            self.get_cache(use_cached_links)
+        visited = self._new_visited_set()
+        self._url_variants = self._new_visited_set()
+        self._queued_via_variant = self._new_visited_set()
+        if resumed := self._open_journal():
+            pending, done, _ = resumed
+            self.frontier = CrawlFrontier(visited=done, visited_set=visited)
+            for url in pending:
+                self.frontier.add(url, self.url_priority(url, 0))
         else:
-            self.urls_to_visit = [self.base_url] + initial_urls
-
-        # ensure that the url is actual available.
-        self.test_base_url()
+            self.frontier = CrawlFrontier(
+                (self.canonicalize_url(url) for url in [self.base_url] + initial_urls),
+                visited_set=visited,
+            )
+            for url in self.frontier.queued():
+                self._journal.queued(url)
+            # products earlier crawls found are fetched first, while
+            # discovery finds the new ones
+            if self.conditional_requests or self.skip_unchanged_bodies:
+                for url in self.page_state.urls():
+                    if self.url_in_domain(url) and self.is_product_url(url):
+                        self._add_to_frontier(url)
+
+        # ensure that the url is actual available. In a thread, so other
+        # stores crawling in the same loop aren't blocked.
+        await asyncio.to_thread(self.test_base_url)
 
         self.count = 0
 
-        async with aiohttp.ClientSession() as session:
-            last_url = self.base_url  # Track last URL for referer header
-            while self.urls_to_visit:
-                tasks = []
-                # Process URLs in batches
-                # create a batch of URLs to visit
-                batch_urls = []
-                for _ in range(min(self.batch_size, len(self.urls_to_visit))):
-                    url = self.urls_to_visit.pop()
-                    if url in self.visited_urls:
-                        continue
-                    self.visited_urls.add(url)
-                    batch_urls.append(url)
-                    # Use base_url as referer for first batch, last_url for subsequent batches
-                    referer = last_url if self.count > 0 else self.base_url
-                    task = asyncio.create_task(self.fetch_page(session, url, referer))
-                    tasks.append(task)
-
-                # wait for all tasks to complete
-                responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Update last_url to the first URL from this batch for next referer
-                if batch_urls:
-                    last_url = batch_urls[0]
-
-                # Process responses
-                for url, result in zip(batch_urls, responses):
-                    # Skip if result is an exception
-                    if isinstance(result, Exception):
-                        self.logger.error(f"Exception while fetching {url}: {result}")
-                        self.count += 1
-                        continue
-
-                    # Unpack the tuple (url, content) returned by fetch_page
-                    fetch_url, response = result
-
-                    if response:
-                        soup = None
-                        # If it is a product page, extract book information
-                        if self.is_product_url(url):
-                            soup = BeautifulSoup(
-                                response, "lxml", parse_only=self.strainer
-                            )
-                            try:
-                                book_info = self.extract_book_info(soup, url)
-
-                                if book_info is not None:
-                                    try:
-                                        book_info = Book(**book_info)
-                                        book_info.price *= self.convert_rate
-
-                                    except ValidationError as e:
-                                        logger.warning(
-                                            f"Could not validate book info on {url}: {e}"
-                                        )
-                                        continue
-
-                            except AttributeError:
-                                logger.warning(
-                                    f"Could not find essential book details on {url}"
-                                )
-                                continue
-
-                            self.add_book(book_info)
-                            if book_info is not None:
-                                logger.info(
-                                    f"SUCCESS - Added {book_info.title} to all books - {url}"
-                                )
-
-                        soup = BeautifulSoup(
-                            response, "lxml", parse_only=SoupStrainer("a")
-                        )
+        async with self.client_session() as session:
+            await self.run_fetch_workers(session, self.frontier, self._handle_page)
+        self._close_journal()
+
+        self.logger.info(
+            f"Finished crawling {self.name} in {time.time() - start} seconds"
+        )
+        self.logger.info(
+            f"{self.name}: URL canonicalization saved {self.canonical_dedupes} duplicate fetches"
+        )
+        if isinstance(visited, CompactVisitedSet):
+            nbytes = visited.nbytes + self._url_variants.nbytes + self._queued_via_variant.nbytes
+            self.logger.info(
+                f"{self.name}: {len(visited)} visited URLs in "
+                f"{nbytes / 2**20:.1f} MB, estimated "
+                f"false-positive rate {visited.false_positive_rate():.2e}"
+            )
+        return self.all_books
 
-                        # Find all links on the page and add product links to the queue
-                        new_links = [
-                            link["href"] for link in soup.find_all("a", href=True)
-                        ]
-                        for link in new_links:
-                            # make sure its actually a real url
-                            try:
-                                absolute_link = urljoin(url, link)
-                            except ValueError:
-                                # Skip malformed URLs (e.g., links with invalid characters like [xiii])
-                                continue
-
-                            if (
-                                self.url_in_domain(absolute_link)
-                                and not self.ignore_url(absolute_link)
-                                and absolute_link not in self.visited_urls
-                                and absolute_link not in self.urls_to_visit
-                            ):
-                                self.urls_to_visit.append(absolute_link)
-
-                    self.count += 1
-
-                # Add delay between batches to avoid rate limiting
-                if self.urls_to_visit and self.batch_delay > 0:
-                    await asyncio.sleep(self.batch_delay)
-                    # if self.count % 25 == 0:
-                    # self.save_lines_to_file(self.urls_to_visit, f"saved_progress/urls_to_visit_{start_timestamp}")
-                    # self.save_lines_to_file(list(self.visited_urls), f"saved_progress/visited_urls_{start_timestamp}")
-                    # logger.info(f'Saved progress at {self.count} links')
-
-                    # self.write_to_json()
+    def parse_page(self, response: bytes, url) -> tuple[dict | None, list[str]]:
+        """
+        Parse a crawled page into (book_info, links), the links absolute.
 
-            self.logger.info(
-                f"Finished crawling {self.name} in {time.time() - start} seconds"
+        Product pages are parsed once with the store's strainer; the links come
+        from the same tree. Other pages only get their anchors harvested.
+        """
+        if not self.is_product_url(url):
+            return None, self.parse_links(response, url)
+
+        recorder = HrefRecorder(self.strainer)
+        soup = self.make_soup(response, url, recorder)
+        hrefs = recorder.hrefs + [link["href"] for link in soup.find_all("a", href=True)]
+        links = absolute_links(hrefs, url)
+        try:
+            book_info = self.extract_book_info(soup, url)
+        except AttributeError:
+            self.logger.warning(f"Could not find essential book details on {url}")
+            book_info = None
+        return book_info, links
+
+    def parse_links(self, response: bytes, url) -> list[str]:
+        """The absolute links on a page, read straight off lxml's tokenizer without a soup."""
+        return harvest_links(response, url, self.page_charset(response, url))
+
+    def page_charset(self, response: bytes, url) -> str | None:
+        """
+        The charset `url`'s host declares, worked out once per host.
+
+        A <meta> charset near the top of the page wins over the Content-Type
+        header, whose iso-8859-1 is usually a server default rather than a
+        declaration.
+        """
+        host = urlparse(url).hostname
+        if host in self._charsets:
+            return self._charsets[host]
+        start = time.perf_counter()
+        match = META_CHARSET_RE.search(response, 0, 4096)
+        if match:
+            charset = match.group(1).decode("ascii")
+        else:
+            charset = self._header_charsets.get(host)
+        try:
+            charset = charset and codecs.lookup(charset).name
+        except LookupError:
+            charset = None
+        if charset == "iso8859-1" and not match:
+            charset = None
+        if charset:
+            self._charsets[host] = charset
+        self.decode_seconds += time.perf_counter() - start
+        return charset
+
+    def make_soup(self, response: bytes, url, parse_only=None) -> BeautifulSoup:
+        """
+        Parse a page body with the charset its host declares.
+
+        With the charset given, BeautifulSoup skips its encoding detection
+        on every page and only falls back to it when the body does not
+        decode with the declared charset.
+        """
+        return BeautifulSoup(
+            response,
+            "lxml",
+            parse_only=parse_only,
+            from_encoding=self.page_charset(response, url),
+        )
+
+    def _has_product_fingerprint(self, response: bytes) -> bool:
+        """Cheap check on the raw body that a product page could hold a book."""
+        fingerprint = self.product_fingerprint
+        if fingerprint is None:
+            return True
+        if isinstance(fingerprint, bytes):
+            fingerprint = (fingerprint,)
+        if any(marker in response for marker in fingerprint):
+            return True
+        self.fingerprint_skips += 1
+        return False
+
+    def extract_from_response(self, response: bytes, url) -> dict | None:
+        """
+        Extract book info from the raw body of a product page.
+
+        Used by the sitemap-seeded crawls. Stores whose extract_book_info works
+        on html text or bytes instead of a soup override this.
+        """
+        soup = self.make_soup(response, url, self.strainer)
+        try:
+            return self.extract_book_info(soup, url)
+        except AttributeError:
+            self.logger.warning(f"Could not find essential book details on {url}")
+            return None
+
+    async def _parse(self, method: str, response: bytes, url):
+        """Run a parse method inline, or in the parse pool when one is running."""
+        if self._parse_pool is None:
+            return getattr(self, method)(response, url)
+        # the pool's instance never sees our Content-Type headers
+        charset = self.page_charset(response, url)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._parse_pool, parse_pool.call, type(self), method, response, url, charset
+        )
+
+    def _add_book_info(self, book_info: dict | None, url) -> dict | None:
+        """Validate and add a book. Returns the book as stored, or None."""
+        if book_info is None:
+            return None
+        try:
+            book = Book(**book_info)
+            if self.convert_rate != 1:
+                book.price = round(book.price * self.convert_rate, 2)
+        except ValidationError as e:
+            logger.warning(f"Could not validate book info on {url}: {e}")
+            return None
+
+        self.add_book(book)
+        logger.info(f"SUCCESS - Added {book.title} to all books - {url}")
+        book_dict = book.model_dump(exclude_none=True)
+        if self._journal is not None:
+            self._journal.book(url, book_dict)
+        return book_dict
+
+    def _stored_page(self, url) -> dict | None:
+        """State stored for `url` by a crawl with the current extractor, if any."""
+        state = self.page_state.get(url)
+        if state and state.get("book") and state.get("extractor") == self.extractor_version:
+            return state
+        return None
+
+    def _reusable_state(self, url) -> dict | None:
+        """Stored state for `url` if the page can be fetched conditionally."""
+        if not self.conditional_requests:
+            return None
+        state = self._stored_page(url)
+        if state and (state.get("etag") or state.get("last_modified")):
+            return state
+        return None
+
+    def _body_hash(self, response: bytes) -> str:
+        return hashlib.blake2b(response, digest_size=16).hexdigest()
+
+    def _unchanged_body(self, url, body_hash: str) -> dict | None:
+        """Stored state for `url` if it was produced from exactly this body."""
+        if not self.skip_unchanged_bodies or not self.is_product_url(url):
+            return None
+        state = self._stored_page(url)
+        if state and state.get("body_hash") == body_hash:
+            self.unchanged_bodies += 1
+            return state
+        return None
+
+    def _remember_page(
+        self, url, book: dict | None, links=(), body_hash: str = None
+    ) -> None:
+        """Store the book a product page produced, with its validators and body hash."""
+        validators = self._validators.pop(url, None)
+        if not (self.conditional_requests or self.skip_unchanged_bodies):
+            return
+        if book:
+            self.page_state.set(
+                url,
+                {
+                    **(validators or {}),
+                    "body_hash": body_hash,
+                    "extractor": self.extractor_version,
+                    "book": book,
+                    "links": links,
+                },
+            )
+        elif self.is_product_url(url):
+            # nothing to reuse any more
+            self.page_state.delete(url)
+
+    def _forget_page(self, url) -> None:
+        if self.conditional_requests or self.skip_unchanged_bodies:
+            self.page_state.delete(url)
+
+    def _reuse_page(self, url, state: dict = None, depth: int = 0) -> None:
+        """Re-emit the stored book of an unchanged page and queue its product links."""
+        self._validators.pop(url, None)
+        state = state or self.page_state.get(url)
+        for link in state.get("links", []):
+            self.queue_link(link, depth + 1)
+        self._emit_book(state["book"])
+        if self._journal is not None:
+            self._journal.book(url, state["book"])
+        logger.info(f"UNCHANGED - Reused {state['book']['title']} - {url}")
+
+    async def _handle_page(self, url, result) -> None:
+        """Extract a book from a fetched page and queue the links it contains."""
+        self.count += 1
+        depth = self._link_depth.pop(url, 0)
+
+        # Skip if result is an exception
+        if isinstance(result, Exception):
+            self.logger.error(f"Exception while fetching {url}: {result}")
+            return
+
+        # Unpack the tuple (url, content) returned by fetch_page
+        fetch_url, response = result
+        if response is NOT_MODIFIED:
+            self._reuse_page(url, depth=depth)
+            return
+        if not response:
+            return
+
+        body_hash = self._body_hash(response)
+        if state := self._unchanged_body(url, body_hash):
+            self._reuse_page(url, state, depth)
+            return
+
+        if self.is_product_url(url) and not self._has_product_fingerprint(response):
+            book_info, links = None, await self._parse("parse_links", response, url)
+        else:
+            book_info, links = await self._parse("parse_page", response, url)
+
+        # Add the page's links to the queue
+        product_links = []
+        for link in links:
+            self.queue_link(link, depth + 1)
+            # kept with the book, so a 304 for this page still leads to them
+            if book_info and self.is_product_url(link):
+                product_links.append(self.canonicalize_url(link))
+
+        book = self._add_book_info(book_info, url)
+        self._remember_page(url, book, product_links, body_hash)
+
+    async def _handle_product_page(self, url, result) -> None:
+        """Extract a book from a page fetched from a fixed list of product URLs."""
+        self.count += 1
+
+        if isinstance(result, Exception):
+            self.logger.error(f"Exception while fetching {url}: {result}")
+            return
+
+        _, response = result
+        if response is NOT_MODIFIED:
+            self._reuse_page(url)
+            return
+        if not response:
+            return
+
+        body_hash = self._body_hash(response)
+        if state := self._unchanged_body(url, body_hash):
+            self._reuse_page(url, state)
+            return
+
+        if not self._has_product_fingerprint(response):
+            self._remember_page(url, None)
+            return
+
+        book_info = await self._parse("extract_from_response", response, url)
+        self._remember_page(url, self._add_book_info(book_info, url), (), body_hash)
+
+    async def sitemap_urls(
+        self,
+        *sitemaps: str,
+        since=None,
+        min_priority: float | None = None,
+        url_filter=None,
+        sitemap_filter=None,
+    ) -> list[str]:
+        """
+        Page URLs listed in `sitemaps`, in order and without duplicates.
+
+        The sitemaps are streamed through a `SitemapReader` (see there for
+        the filters), following sitemap indexes. Raises SitemapError when
+        one cannot be fetched.
+        """
+        async with self.client_session() as session:
+            reader = SitemapReader(
+                session,
+                self.headers,
+                since=since,
+                min_priority=min_priority,
+                url_filter=url_filter,
+                sitemap_filter=sitemap_filter,
             )
-            return self.all_books
+            urls = [url for sitemap in sitemaps async for url in reader.urls(sitemap)]
+        self.logger.info(
+            f"{self.name}: {len(urls)} URLs from {reader.sitemaps_read} sitemap(s), "
+            f"{reader.skipped} entries filtered out"
+            + (f" (since {since})" if since else "")
+        )
+        return urls
+
+    async def crawl_urls(self, urls) -> list[dict]:
+        """
+        Fetch a fixed list of product URLs (e.g. from a sitemap) and extract a
+        book from each, without following links.
+        """
+        self.count = 0
+        done = set()
+        if resumed := self._open_journal():
+            _, done, _ = resumed
+        # sitemap stores hand every product URL they have over at once, so
+        # visited_error_rate matters here as much as for link-following crawls
+        self.frontier = CrawlFrontier(urls, visited=done, visited_set=self._new_visited_set())
+        async with self.client_session() as session:
+            await self.run_fetch_workers(
+                session, self.frontier, self._handle_product_page
+            )
+        self._close_journal()
+        return self.all_books
+
+    async def run_fetch_workers(self, session: ClientSession, frontier: CrawlFrontier, handle_page):
+        """Fetch pages continuously with `batch_size` concurrent workers.
+
+        URLs are taken from `frontier`, which may be empty for a while as
+        pages are still being handled. `handle_page(url, result)` receives either the
+        `(url, content)` tuple from `fetch_page` or the exception it raised; it
+        may be a coroutine function and may queue more URLs.
+
+        Fetched pages go through a bounded queue to the parser tasks, so a new
+        fetch starts as soon as a worker is free instead of waiting for the
+        slowest page of a batch, and parsing overlaps with network I/O.
+        Workers exit once nothing is queued and no fetched page is still
+        waiting to be handled (handling a page may discover more URLs).
+        Handled pages are recorded in the crawl journal, if one is open.
+
+        How many fetches actually run at once is decided per host by an
+        AdaptiveConcurrency limit, which is saved for the next run. A worker
+        takes a slot for the host of the next URL before popping it, so URLs
+        leave the frontier only as fast as they can be fetched and URLs
+        queued meanwhile with a better priority still go first. The slot is
+        only given back `batch_delay` seconds after the fetch.
+
+        With `parse_workers > 0` pages are parsed in a process pool of that
+        size, with one parser task per pool process.
+        """
+        concurrency = max(self.max_concurrency, self.batch_size, 1)
+        parsers = max(1, self.parse_workers)
+        results = asyncio.Queue(maxsize=max(1, self.batch_size) + parsers)
+        wake = asyncio.Event()
+        in_progress = 0
+        last_url = None  # Track last URL for referer header
+
+        async def fetch_worker():
+            nonlocal in_progress, last_url
+            while True:
+                url = frontier.peek()
+                if url is None:
+                    if in_progress == 0:
+                        wake.set()
+                        return
+                    wake.clear()
+                    await wake.wait()
+                    continue
+
+                host = self.host_concurrency(url)
+                await host.acquire()
+                # while we waited, the URL may have gone to another worker or
+                # one from another host may have moved ahead of it
+                url = frontier.peek()
+                if url is None or self.host_concurrency(url) is not host:
+                    await host.release()
+                    continue
+                frontier.pop()
+
+                in_progress += 1
+                referer = last_url or self.base_url
+                last_url = url
+                try:
+                    try:
+                        result = await self.fetch_page(session, url, referer)
+                    except HostDownError:
+                        # every URL left on the host would fail too; end the crawl
+                        # as failed rather than as a success with pages missing
+                        raise
+                    except Exception as e:
+                        result = e
+                    await results.put((url, result))
+
+                    # the slot is held through the delay, so it spaces out the
+                    # host's requests however many workers are waiting for it
+                    if self.batch_delay > 0:
+                        await asyncio.sleep(self.batch_delay)
+                finally:
+                    await host.release()
+
+        async def parser():
+            nonlocal in_progress
+            while (item := await results.get()) is not None:
+                url, result = item
+                try:
+                    handled = handle_page(url, result)
+                    if asyncio.iscoroutine(handled):
+                        await handled
+                    if self._journal is not None:
+                        self._journal.done(url)
+                    if self.book_sink is not None:
+                        # writes falling behind hold up parsing, and through
+                        # the results queue, fetching
+                        await self.book_sink.drain()
+                finally:
+                    in_progress -= 1
+                    wake.set()
+
+        if self.parse_workers > 0:
+            self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+
+        journaling = None
+        if self._journal is not None:
+            journaling = asyncio.create_task(self._journal.autoflush())
+
+        parser_tasks = [asyncio.create_task(parser()) for _ in range(parsers)]
+        parsing = asyncio.gather(*parser_tasks)
+        workers = asyncio.gather(*(fetch_worker() for _ in range(concurrency)))
+        try:
+            await asyncio.wait([parsing, workers], return_when=asyncio.FIRST_COMPLETED)
+            if parsing.done():
+                # the parsers only stop early when handling a page raised
+                parsing.result()
+            await workers
+            for _ in parser_tasks:
+                await results.put(None)
+            await parsing
+        finally:
+            for gathered in (workers, parsing):
+                gathered.cancel()
+                # after a failure the other side ends cancelled; nobody awaits it
+                gathered.add_done_callback(lambda f: f.cancelled() or f.exception())
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(cancel_futures=True)
+                self._parse_pool = None
+            if journaling is not None:
+                journaling.cancel()
+                await self._journal.flush()
+
+            limits = {
+                host: round(controller.limit, 2)
+                for host, controller in self._concurrency.items()
+            }
+            if limits:
+                save_concurrency_limits(limits)
+                self.logger.info(f"{self.name}: learned concurrency limits {limits}")
+            if self._page_state is not None:
+                self._page_state.close()
+                self._page_state = None
+            if self.decode_seconds:
+                self.logger.info(
+                    f"{self.name}: {self.decode_seconds:.2f}s decoding page bodies, "
+                    f"charsets {self._charsets}"
+                )
+            if self.truncated_bodies:
+                self.logger.info(
+                    f"{self.name}: stopped reading {self.truncated_bodies} pages early"
+                )
+            if self.fingerprint_skips:
+                self.logger.info(
+                    f"{self.name}: skipped parsing {self.fingerprint_skips} pages "
+                    f"without a product fingerprint"
+                )
+            if self.not_modified or self.unchanged_bodies:
+                self.logger.info(
+                    f"{self.name}: reused stored books for {self.not_modified} pages "
+                    f"answered with 304 and {self.unchanged_bodies} with unchanged bodies"
+                )
+            if self.bytes_decoded:
+                self.logger.info(
+                    f"{self.name}: received {self.bytes_received / 2**20:.1f} MB of pages, "
+                    f"{self.bytes_decoded / 2**20:.1f} MB decoded "
+                    f"({1 - self.bytes_received / self.bytes_decoded:.0%} saved by compression)"
+                )
+            for host, bucket in self._rate_limits.items():
+                if bucket.throttled:
+                    self.logger.info(
+                        f"{self.name}: {host} throttled {bucket.throttled} times, "
+                        f"ended at {bucket.rate:.2f} req/s"
+                    )
+            for host, breaker in self._breakers.items():
+                if breaker.trips:
+                    self.logger.info(
+                        f"{self.name}: circuit for {host} opened {breaker.trips} times"
+                    )
+            if self.retry_policy.retries:
+                self.logger.info(
+                    f"{self.name}: {self.retry_policy.retries} retries, "
+                    f"{self.retry_policy.exhausted} pages given up on an empty retry budget"
+                )
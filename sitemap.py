@@ -0,0 +1,165 @@
+"""
+Streaming sitemap reader shared by the sitemap-seeded stores.
+
+`SitemapReader.urls` fetches a sitemap with the crawl's aiohttp session and
+feeds the body to lxml's pull parser a chunk at a time, yielding each <url>
+as soon as its closing tag has been parsed and throwing the element away,
+so a 50k-URL sitemap is never held in memory as one document. Sitemap
+indexes are followed (optionally only the child sitemaps `sitemap_filter`
+accepts), gzipped sitemap files (.xml.gz) are inflated on the fly, and
+URLs are filtered by lastmod, priority and `url_filter` and de-duplicated
+across every sitemap the reader reads.
+"""
+
+import logging
+import zlib
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime
+
+import aiohttp
+from lxml import etree
+
+logger = logging.getLogger("scraper")
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class SitemapError(Exception):
+    pass
+
+
+def parse_lastmod(text: str | None) -> datetime | None:
+    """A sitemap <lastmod> (W3C datetime, a date or a full timestamp), or None."""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _older(lastmod: datetime, since: datetime) -> bool:
+    # last_crawl_success is a naive local time; sitemaps usually carry an offset
+    if since.tzinfo is None and lastmod.tzinfo is not None:
+        lastmod = lastmod.astimezone().replace(tzinfo=None)
+    elif since.tzinfo is not None and lastmod.tzinfo is None:
+        lastmod = lastmod.astimezone()
+    return lastmod < since
+
+
+def _local_name(tag) -> str:
+    return tag.rpartition("}")[2] if isinstance(tag, str) else ""
+
+
+class SitemapReader:
+    """
+    Reads <url> entries out of sitemaps and sitemap indexes.
+
+    `since` drops URLs, and whole child sitemaps, whose lastmod is older;
+    entries without a lastmod are kept. `min_priority` drops URLs whose
+    priority is missing or lower. `url_filter(url)` and
+    `sitemap_filter(sitemap_url)` choose the page URLs to yield and the
+    child sitemaps of an index to follow.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        headers: dict | None = None,
+        since: datetime | None = None,
+        min_priority: float | None = None,
+        url_filter: Callable[[str], bool] | None = None,
+        sitemap_filter: Callable[[str], bool] | None = None,
+        timeout: float = 60,
+    ):
+        self.session = session
+        self.headers = headers
+        self.since = since
+        self.min_priority = min_priority
+        self.url_filter = url_filter
+        self.sitemap_filter = sitemap_filter
+        self.timeout = timeout
+        self.sitemaps_read = 0
+        self.skipped = 0
+        self._seen = set()
+
+    def _wanted(self, entry: dict) -> bool:
+        lastmod = parse_lastmod(entry.get("lastmod"))
+        if self.since is not None and lastmod is not None and _older(lastmod, self.since):
+            return False
+        if entry["tag"] == "sitemap":
+            return self.sitemap_filter is None or self.sitemap_filter(entry["loc"])
+        if self.min_priority is not None:
+            try:
+                if float(entry.get("priority") or "") < self.min_priority:
+                    return False
+            except ValueError:
+                return False
+        return self.url_filter is None or self.url_filter(entry["loc"])
+
+    async def _entries(self, sitemap_url: str) -> AsyncIterator[dict]:
+        """The <url> and <sitemap> entries of one sitemap, as they are parsed."""
+        parser = etree.XMLPullParser(events=("end",), recover=True, resolve_entities=False)
+        try:
+            async with self.session.get(
+                sitemap_url, headers=self.headers, timeout=self.timeout
+            ) as response:
+                if response.status != 200:
+                    raise SitemapError(f"HTTP {response.status} for sitemap {sitemap_url}")
+                inflater = None
+                first = True
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    if first:
+                        first = False
+                        # a .xml.gz file, as opposed to a gzip Content-Encoding aiohttp undid
+                        if chunk.startswith(GZIP_MAGIC):
+                            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    if inflater is not None:
+                        chunk = inflater.decompress(chunk)
+                    parser.feed(chunk)
+                    for entry in self._read_events(parser):
+                        yield entry
+                if inflater is not None:
+                    parser.feed(inflater.flush())
+        except (aiohttp.ClientError, TimeoutError, zlib.error) as e:
+            raise SitemapError(f"Could not read sitemap {sitemap_url}: {e}") from e
+        parser.close()
+        for entry in self._read_events(parser):
+            yield entry
+        self.sitemaps_read += 1
+
+    @staticmethod
+    def _read_events(parser):
+        for _, element in parser.read_events():
+            tag = _local_name(element.tag)
+            if tag not in ("url", "sitemap"):
+                continue
+            entry = {"tag": tag}
+            for child in element:
+                name = _local_name(child.tag)
+                if name in ("loc", "lastmod", "priority") and child.text:
+                    entry[name] = child.text.strip()
+            # done with it: drop it and the entries before it from the tree
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+            if entry.get("loc"):
+                yield entry
+
+    async def urls(self, sitemap_url: str) -> AsyncIterator[str]:
+        """Page URLs from `sitemap_url`, following it if it is a sitemap index."""
+        children = []
+        async for entry in self._entries(sitemap_url):
+            if not self._wanted(entry):
+                self.skipped += 1
+            elif entry["tag"] == "sitemap":
+                # indexes are short; read the children once this response is done
+                children.append(entry["loc"])
+            elif entry["loc"] not in self._seen:
+                self._seen.add(entry["loc"])
+                yield entry["loc"]
+        for child in children:
+            async for url in self.urls(child):
+                yield url
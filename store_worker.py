@@ -0,0 +1,99 @@
+"""
+Store crawls in worker processes.
+
+`main.py --processes N` runs `crawl_store` for each store in a process pool,
+so parse-heavy stores get a core each. The worker sends its progress and
+books back over a multiprocessing queue as `(kind, store name, payload)`
+messages, books in chunks as soon as they are found, and the coordinator
+does the uploads, so workers never connect to Mongo.
+"""
+
+import asyncio
+import logging
+import queue as queue_module
+import time
+
+from http_client import HttpClient
+from response_cache import ResponseCache
+
+logger = logging.getLogger("scraper")
+
+# books per queue message, so one huge store isn't pickled in a single piece
+BOOK_CHUNK = 500
+
+
+class QueueSink:
+    """Book sink for worker processes: sends the books to the coordinator BOOK_CHUNK at a time."""
+
+    def __init__(self, queue, name: str):
+        self.queue = queue
+        self.name = name
+        self.count = 0
+        self._chunk = []
+
+    def add(self, book: dict) -> None:
+        self._chunk.append(book)
+        self.count += 1
+        if len(self._chunk) >= BOOK_CHUNK:
+            self.flush()
+
+    async def drain(self) -> None:
+        # chunks leave with each put; the coordinator's BookSink applies the backpressure
+        pass
+
+    def flush(self) -> None:
+        if self._chunk:
+            self.queue.put(("books", self.name, self._chunk))
+            self._chunk = []
+
+
+def crawl_store(
+    scraper, queue, last_crawl_success, pool_size, limit_per_host, cache_dir=None
+):
+    asyncio.run(
+        _crawl_store(
+            scraper, queue, last_crawl_success, pool_size, limit_per_host, cache_dir
+        )
+    )
+
+
+async def _crawl_store(
+    scraper, queue, last_crawl_success, pool_size, limit_per_host, cache_dir
+):
+    start = time.monotonic()
+    error = None
+    name = scraper.__name__
+    cache = ResponseCache(cache_dir) if cache_dir else None
+    sink = None
+    try:
+        scrape = scraper()
+        scrape.response_cache = cache
+        name = scrape.name
+        sink = scrape.book_sink = QueueSink(queue, name)
+        queue.put(("started", name, None))
+        async with HttpClient(limit=pool_size, limit_per_host=limit_per_host) as http:
+            scrape.http_client = http
+            books = await scrape.crawl_product_pages(
+                last_crawl_success=last_crawl_success
+            )
+        # the API-based stores build their own list instead of emitting
+        for book in books or []:
+            sink.add(book)
+    except Exception as e:
+        logger.error(f"Critical Error in {name}: {e}", exc_info=True)
+        error = e.__str__()
+    finally:
+        if sink is not None:
+            sink.flush()
+        if cache is not None:
+            cache.log_stats()
+            cache.close()
+        queue.put(("finished", name, (error, time.monotonic() - start)))
+
+
+def next_message(queue, timeout: float = 1.0):
+    """Next message from the workers, or None if nothing arrived in `timeout` seconds."""
+    try:
+        return queue.get(timeout=timeout)
+    except queue_module.Empty:
+        return None
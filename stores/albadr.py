@@ -7,6 +7,7 @@ class AlBadrBooksScraper(AbstractBookScraper):
     def __init__(self):
         super().__init__("https://albadr.co.uk/", "Al-Badr", convert_rate=1.3)
         self.batch_size = 5
+        self.trailing_slash = True
 
     def ignore_url(self, url) -> bool:
         ig = ["/uploads/", "/wishlist/", "/about/", "/contact/", "?", "#"]
@@ -15,6 +15,8 @@ class AlBalagh(AbstractBookScraper):
             ],
         )
         self.batch_size = 20
+        # every URL is a candidate, but only product pages have the title block
+        self.product_fingerprint = b"ty-product-block-title"
 
     def ignore_url(self, url) -> bool:
         ig = [
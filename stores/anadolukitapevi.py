@@ -7,13 +7,9 @@
 #   related products further down also use these classes, so we must scope
 #   to the brand box).
 
-import asyncio
-import aiohttp
 from bs4 import BeautifulSoup
-import requests
 from scraper import AbstractBookScraper
-import time
-from book import Book
+import asyncio
 import logging
 
 logger = logging.getLogger("scraper")
@@ -30,39 +26,21 @@ class Anadolukitapevi(AbstractBookScraper):
         super().__init__("https://www.anadolukitapevi.com/", "Anadolu Kitabevi")
         self.batch_size = 15
         self.batch_delay = 0.1
+        # author/publisher landing pages in the sitemap lack the Product block
+        self.product_fingerprint = b"schema.org/Product"
 
     def is_product_url(self, url):
         return True
 
-    def _get_product_urls(self) -> list[str]:
-        resp = requests.get(
-            f"{self.base_url}sitemap.xml", headers=self.headers, timeout=30
+    async def _get_product_urls(self) -> list[str]:
+        # the homepage sneaks in at priority 1.0; skip anything that
+        # clearly isn't a product slug.
+        home = self.base_url.rstrip("/")
+        return await self.sitemap_urls(
+            f"{self.base_url}sitemap.xml",
+            min_priority=PRODUCT_PRIORITY_THRESHOLD,
+            url_filter=lambda url: url.rstrip("/") != home,
         )
-        resp.raise_for_status()
-        sitemap = BeautifulSoup(resp.text, "xml")
-
-        urls = []
-        seen = set()
-        for url_tag in sitemap.find_all("url"):
-            loc = url_tag.find("loc")
-            priority = url_tag.find("priority")
-            if not loc or not priority:
-                continue
-            try:
-                if float(priority.text) < PRODUCT_PRIORITY_THRESHOLD:
-                    continue
-            except ValueError:
-                continue
-            link = loc.text.strip()
-            # the homepage sneaks in at priority 1.0; skip anything that
-            # clearly isn't a product slug.
-            if link.rstrip("/") == self.base_url.rstrip("/"):
-                continue
-            if link in seen:
-                continue
-            seen.add(link)
-            urls.append(link)
-        return urls
 
     def extract_book_info(self, html: str, url: str) -> dict | None:
         soup = BeautifulSoup(html, "lxml")
@@ -167,42 +145,13 @@ class Anadolukitapevi(AbstractBookScraper):
 
         return book_info
 
+    def extract_from_response(self, response: bytes, url) -> dict | None:
+        return self.extract_book_info(response.decode("utf-8", errors="replace"), url)
+
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
-        self.test_base_url()
+        await asyncio.to_thread(self.test_base_url)
 
-        urls = self._get_product_urls()
+        urls = await self._get_product_urls()
         logger.info(f"{self.name} - Found {len(urls)} candidate product URLs")
 
-        async with aiohttp.ClientSession() as session:
-            while urls:
-                batch_urls = urls[: self.batch_size]
-                urls = urls[self.batch_size :]
-
-                tasks = [
-                    asyncio.create_task(self.fetch_page(session, url))
-                    for url in batch_urls
-                ]
-                responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for result in responses:
-                    if isinstance(result, Exception):
-                        self.logger.error(f"Exception fetching page: {result}")
-                        continue
-                    url, content = result
-                    if not content:
-                        continue
-                    html = content.decode("utf-8", errors="replace")
-                    book_info = self.extract_book_info(html, url)
-                    if book_info is None:
-                        continue
-                    try:
-                        book = Book(**book_info)
-                    except Exception as e:
-                        logger.warning(f"Could not validate book on {url}: {e}")
-                        continue
-                    self.add_book(book)
-
-                if urls and self.batch_delay > 0:
-                    time.sleep(self.batch_delay)
-
-        return self.all_books
+        return await self.crawl_urls(urls)
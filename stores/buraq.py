@@ -10,6 +10,10 @@ class Buraq(AbstractBookScraper):
 
         self.headers["Accept-Language"] = "en-US,en;q=0.5"
 
+        # Shopify: variant and search-position params all render the same product
+        self.drop_query_params = {"variant", "_pos", "_sid", "_ss"}
+        self.trailing_slash = False
+
     def ignore_url(self, url) -> bool:
         return "#" in url
 
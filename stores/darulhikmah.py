@@ -2,13 +2,10 @@
 # the site is a BigCommerce Stencil store - most fields come from meta tags,
 # but publisher and author live in the custom-fields <dl> so we pull them with regex.
 
-import asyncio
-import aiohttp
 from bs4 import BeautifulSoup
-import requests
 from scraper import AbstractBookScraper
-import time
-from book import Book
+from sitemap import SitemapError, SitemapReader
+import asyncio
 import logging
 import re
 
@@ -39,7 +36,6 @@ class DarulHikmah(AbstractBookScraper):
                 "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:145.0) Gecko/20100101 Firefox/145.0",
                 "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
                 "Accept-Language": "en-US,en;q=0.5",
-                "Accept-Encoding": "gzip, deflate",
                 "Connection": "keep-alive",
                 "Upgrade-Insecure-Requests": "1",
                 "Sec-Fetch-Dest": "document",
@@ -51,6 +47,9 @@ class DarulHikmah(AbstractBookScraper):
     def is_product_url(self, url):
         return True
 
+    def extract_from_response(self, response: bytes, url) -> dict | None:
+        return self.extract_book_info(response, url)
+
     def extract_book_info(self, response: bytes, url: str) -> dict | None:
         # BigCommerce pages are large; parse the meta block with BeautifulSoup
         # but keep the raw html around for regex-based custom-field lookup.
@@ -108,71 +107,36 @@ class DarulHikmah(AbstractBookScraper):
 
         return book_info
 
-    def _get_product_urls(self) -> list[str]:
-        """Walk the paginated product sitemap until a page has no <loc> entries."""
+    async def _get_product_urls(self) -> list[str]:
+        """Walk the paginated product sitemap until a page brings no new URLs."""
         product_urls: list[str] = []
-        page = 1
-        while True:
-            sitemap_url = (
-                f"{self.base_url}xmlsitemap.php?type=products&page={page}"
-            )
-            try:
-                resp = requests.get(sitemap_url, headers=self.headers, timeout=30)
-            except requests.RequestException as e:
-                logger.warning(f"DarulHikmah - failed to fetch {sitemap_url}: {e}")
-                break
-
-            if resp.status_code != 200 or not resp.text.strip():
-                break
-
-            sitemap = BeautifulSoup(resp.text, "xml")
-            page_urls = [loc.text for loc in sitemap.find_all("loc")]
-            if not page_urls:
-                break
-
-            product_urls.extend(page_urls)
-            logger.info(
-                f"DarulHikmah - sitemap page {page}: {len(page_urls)} urls"
-            )
-            page += 1
-
-        # de-dupe while keeping order
-        seen = set()
-        unique_urls = []
-        for u in product_urls:
-            if u not in seen:
-                seen.add(u)
-                unique_urls.append(u)
-        return unique_urls
+        async with self.client_session() as session:
+            # one reader for every page, so URLs are de-duplicated across pages
+            reader = SitemapReader(session, self.headers, timeout=30)
+            page = 1
+            while True:
+                sitemap_url = (
+                    f"{self.base_url}xmlsitemap.php?type=products&page={page}"
+                )
+                try:
+                    page_urls = [url async for url in reader.urls(sitemap_url)]
+                except SitemapError as e:
+                    logger.warning(f"DarulHikmah - failed to fetch {sitemap_url}: {e}")
+                    break
+                if not page_urls:
+                    break
+
+                product_urls.extend(page_urls)
+                logger.info(
+                    f"DarulHikmah - sitemap page {page}: {len(page_urls)} urls"
+                )
+                page += 1
+        return product_urls
 
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
-        self.test_base_url()
+        await asyncio.to_thread(self.test_base_url)
 
-        urls = self._get_product_urls()
+        urls = await self._get_product_urls()
         logger.info(f"DarulHikmah - Found {len(urls)} product URLs")
 
-        async with aiohttp.ClientSession() as session:
-            all_res = []
-            while len(urls) > 0:
-                batch_urls = urls[: self.batch_size]
-                tasks = []
-                for url in batch_urls:
-                    tasks.append(asyncio.create_task(self.fetch_page(session, url)))
-                    urls.remove(url)
-
-                all_res.extend(await asyncio.gather(*tasks))
-                time.sleep(self.batch_delay)
-
-            for url, response in all_res:
-                if not response:
-                    continue
-                book_info = self.extract_book_info(response, url)
-                if book_info is not None:
-                    try:
-                        book = Book(**book_info)
-                    except Exception as e:
-                        logger.warning(f"Could not validate book on {url}: {e}")
-                        continue
-                    self.add_book(book)
-
-        return self.all_books
+        return await self.crawl_urls(urls)
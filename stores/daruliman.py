@@ -3,14 +3,8 @@
 # JSON-LD "Product" block on each product page, so we parse that.
 # URLs come from the WordPress product sitemap.
 
-import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
-import requests
 from scraper import AbstractBookScraper
-import time
-from datetime import datetime
-from book import Book
+import asyncio
 import logging
 import json
 import re
@@ -28,8 +22,6 @@ class Daruliman(AbstractBookScraper):
         super().__init__("https://darulimanbooks.com/", "Darul Iman Books")
         self.batch_size = 5
         self.batch_delay = 0.1
-        # server ships brotli by default; limit to what aiohttp handles natively
-        self.headers["Accept-Encoding"] = "gzip, deflate"
 
     def is_product_url(self, url):
         return "/product/" in url
@@ -97,6 +89,9 @@ class Daruliman(AbstractBookScraper):
 
         return price, instock
 
+    def extract_from_response(self, response: bytes, url) -> dict | None:
+        return self.extract_book_info(response, url)
+
     def extract_book_info(self, response, url: str) -> dict | None:
         if isinstance(response, (bytes, bytearray)):
             html = response.decode("utf-8", errors="replace")
@@ -136,67 +131,16 @@ class Daruliman(AbstractBookScraper):
 
         return book_info
 
-    def _get_product_urls(self, last_crawl_success=None) -> list[str]:
-        sitemap_url = self.base_url + "wp-sitemap-posts-product-1.xml"
-        resp = requests.get(sitemap_url, headers=self.headers, timeout=30)
-        resp.raise_for_status()
-        print(resp.text)
-
-        soup = BeautifulSoup(resp.text, "xml")
-        urls: list[str] = []
-        for url_tag in soup.find_all("url"):
-            loc = url_tag.find("loc")
-            if not loc:
-                continue
-            href = loc.text.strip()
-            print(href)
-            if not self.is_product_url(href):
-                continue
-
-            lastmod_tag = url_tag.find("lastmod")
-            if last_crawl_success and lastmod_tag:
-                try:
-                    lastmod = datetime.fromisoformat(lastmod_tag.text)
-                    if lastmod.tzinfo:
-                        lastmod = lastmod.replace(tzinfo=None)
-                    if lastmod < last_crawl_success:
-                        continue
-                except ValueError:
-                    pass
+    async def _get_product_urls(self, last_crawl_success=None) -> list[str]:
+        return await self.sitemap_urls(
+            self.base_url + "wp-sitemap-posts-product-1.xml",
+            since=last_crawl_success,
+            url_filter=self.is_product_url,
+        )
 
-            urls.append(href)
+    async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
+        await asyncio.to_thread(self.test_base_url)
 
-        logger.info(f"Daruliman - Found {len(urls)} product URLs in sitemap")
-        return urls
+        urls = await self._get_product_urls(last_crawl_success=last_crawl_success)
 
-    async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
-        self.test_base_url()
-
-        urls = self._get_product_urls(last_crawl_success=last_crawl_success)
-
-        async with aiohttp.ClientSession() as session:
-            all_res = []
-            while len(urls) > 0:
-                batch_urls = urls[: self.batch_size]
-                tasks = []
-                for url in batch_urls:
-                    tasks.append(asyncio.create_task(self.fetch_page(session, url)))
-                    urls.remove(url)
-
-                all_res.extend(await asyncio.gather(*tasks))
-                time.sleep(self.batch_delay)
-
-            for url, response in all_res:
-                if not response:
-                    continue
-                book_info = self.extract_book_info(response, url)
-                if book_info is None:
-                    continue
-                try:
-                    book = Book(**book_info)
-                except Exception as e:
-                    logger.warning(f"Could not validate book on {url}: {e}")
-                    continue
-                self.add_book(book)
-
-        return self.all_books
+        return await self.crawl_urls(urls)
@@ -1,18 +1,18 @@
 # this scraper takes advantage of the sitemap
 
 import asyncio
-import aiohttp
+
 from bs4 import BeautifulSoup, SoupStrainer
-import requests
 from scraper import ScraperError, AbstractBookScraper
-import time
-from book import Book
 
 
 class Irfan(AbstractBookScraper):
     def __init__(self):
         super().__init__("https://www.irfanbooks.org/", "Irfan Books")
         self.strainer = SoupStrainer("meta")
+        self.product_fingerprint = b"product:price:amount"
+        # everything is read from <meta> tags
+        self.body_stop_marker = b"</head>"
 
     def is_product_url(self, url):
         return True
@@ -60,31 +60,11 @@ class Irfan(AbstractBookScraper):
 
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
 
-        self.test_base_url()
-
-        sitemap = requests.get(self.base_url + "store-products-sitemap.xml").text
-
-        soup = BeautifulSoup(sitemap, "xml")
-        urls = [url.text for url in soup.find_all("loc") if "file" not in url.text]
-
-        async with aiohttp.ClientSession() as session:
-            all_res = []
-            while len(urls) > 0:
-                batch_urls = urls[: self.batch_size]
-                tasks = []
-                for url in batch_urls:
-                    tasks.append(asyncio.create_task(self.fetch_page(session, url)))
-                    urls.remove(url)
-
-                all_res.extend(await asyncio.gather(*tasks))
-                time.sleep(self.batch_delay)
+        await asyncio.to_thread(self.test_base_url)
 
-            for url, response in all_res:
-                if response:
-                    soup = BeautifulSoup(response, "lxml", parse_only=self.strainer)
-                    book_info = self.extract_book_info(soup, url)
-                    if book_info is not None:
-                        book_info = Book(**book_info)
-                        self.add_book(book_info)
+        urls = await self.sitemap_urls(
+            self.base_url + "store-products-sitemap.xml",
+            url_filter=lambda url: "file" not in url,
+        )
 
-        return self.all_books
+        return await self.crawl_urls(urls)
@@ -1,10 +1,7 @@
-import asyncio
-import aiohttp
 from bs4 import BeautifulSoup
-import requests
 from scraper import AbstractBookScraper
+import asyncio
 import logging
-from book import Book
 import json
 
 logger = logging.getLogger("scraper")
@@ -18,6 +15,9 @@ class Irsad(AbstractBookScraper):
         super().__init__("https://www.irsad.com.tr/", "Irsad", convert_rate=1)
         self.batch_size = 10
         self.headers["Accept-Language"] = "en-US,en;q=0.9"
+        # every product in the sitemaps is fetched; crawl_urls keeps the
+        # visited URLs in a CompactVisitedSet
+        self.visited_error_rate = 1e-4
 
     def ignore_url(self, url) -> bool:
         return False
@@ -102,64 +102,18 @@ class Irsad(AbstractBookScraper):
 
         return book_info
 
-    def get_all_product_urls(self) -> list[str]:
-        """Fetch sitemap index then collect all product page URLs."""
+    def extract_from_response(self, response: bytes, url) -> dict | None:
+        return self.extract_book_info(response.decode("utf-8", errors="replace"), url)
 
-        base_sitemap = BeautifulSoup(
-            requests.get(f"{self.base_url}sitemap.xml", headers=self.headers).text,
-            "xml",
+    async def get_all_product_urls(self) -> list[str]:
+        """Collect all product page URLs from the product sitemaps in the index."""
+        return await self.sitemap_urls(
+            f"{self.base_url}sitemap.xml",
+            url_filter=self.is_product_url,
+            sitemap_filter=lambda sitemap: "product" in sitemap,
         )
-        sitemap_urls = [
-            url.text
-            for url in base_sitemap.find_all("loc")
-            if "product" in url.text
-        ]
-        logger.info(f"Found {len(sitemap_urls)} product sitemap(s). Fetching URLs...")
-        product_urls = set()
-
-        for sitemap_url in sitemap_urls:
-            sitemap = BeautifulSoup(
-                requests.get(sitemap_url, headers=self.headers).text, "xml"
-            )
-            product_urls.update(
-                url.text
-                for url in sitemap.find_all("loc")
-                if self.is_product_url(url.text)
-            )
-
-        logger.info(f"Found {len(product_urls)} product URLs")
-        return list(product_urls)
 
     async def crawl_product_pages(self, last_crawl_success=None):
-        self.test_base_url()
-        product_urls = self.get_all_product_urls()
-        total_urls = len(product_urls)
-
-        async with aiohttp.ClientSession() as session:
-            while product_urls:
-                batch_urls = product_urls[: self.batch_size]
-                product_urls = product_urls[self.batch_size :]
-
-                tasks = [
-                    asyncio.create_task(self.fetch_page(session, url))
-                    for url in batch_urls
-                ]
-                responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for result in responses:
-                    if isinstance(result, Exception):
-                        self.logger.error(f"Exception fetching page: {result}")
-                        continue
-                    url, content = result
-                    if content:
-                        html = content.decode("utf-8", errors="replace")
-                        book_info = self.extract_book_info(html, url)
-                        if book_info is not None:
-                            book_info = Book(**book_info)
-                            self.add_book(book_info)
-
-                remaining = len(product_urls)
-                if remaining % 100 == 0:
-                    logger.info(f"Processed {total_urls - remaining}/{total_urls} URLs")
-
-        return self.all_books
+        await asyncio.to_thread(self.test_base_url)
+        product_urls = await self.get_all_product_urls()
+        return await self.crawl_urls(product_urls)
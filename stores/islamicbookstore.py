@@ -3,12 +3,8 @@ import re
 import time
 from datetime import datetime
 
-import aiohttp
-import requests
 from bs4 import BeautifulSoup
-from pydantic import ValidationError
 
-from book import Book
 from scraper import AbstractBookScraper
 
 SITEMAP_URL = "https://www.islamicbookstore.com/sitemap.xml"
@@ -52,6 +48,9 @@ class IslamicBookstore(AbstractBookScraper):
         )
         self.batch_size = 10
         self.batch_delay = 0.1
+        self.product_fingerprint = b"PAGE_ATTRS"
+        # nothing after the product section (related items onwards) is used
+        self.body_stop_marker = b'id="ys_relatedItems"'
 
     def is_product_url(self, url: str) -> bool:
         return bool(PRODUCT_URL_RE.search(url))
@@ -190,104 +189,31 @@ class IslamicBookstore(AbstractBookScraper):
     def extract_book_info(self, soup: BeautifulSoup, url) -> dict | None:
         return self._extract_from_html(str(soup), url)
 
-    def _collect_product_urls(self, last_crawl_success: datetime | None) -> list[str]:
-        response = requests.get(SITEMAP_URL, headers=self.headers, timeout=60)
-        response.raise_for_status()
-
-        sitemap = BeautifulSoup(response.text, "xml")
-        urls: list[str] = []
-
-        for url_tag in sitemap.find_all("url"):
-            loc = url_tag.find("loc")
-            if not loc or not loc.text:
-                continue
-
-            href = loc.text.strip()
-            if not self.is_product_url(href):
-                continue
-
-            if last_crawl_success:
-                lastmod_tag = url_tag.find("lastmod")
-                if lastmod_tag and lastmod_tag.text:
-                    try:
-                        raw_lastmod = lastmod_tag.text.strip().replace("Z", "+00:00")
-                        lastmod = datetime.fromisoformat(raw_lastmod)
-                        if lastmod.tzinfo:
-                            lastmod = lastmod.replace(tzinfo=None)
-                        last_success = last_crawl_success
-                        if getattr(last_success, "tzinfo", None):
-                            last_success = last_success.replace(tzinfo=None)
-                        if lastmod < last_success:
-                            continue
-                    except ValueError:
-                        pass
-
-            urls.append(href)
+    def extract_from_response(self, response: bytes, url) -> dict | None:
+        return self._extract_from_html(response.decode("latin-1", errors="replace"), url)
 
-        self.logger.info(
-            "%s: %d product URLs from sitemap", self.name, len(urls)
+    async def _collect_product_urls(self, last_crawl_success: datetime | None) -> list[str]:
+        return await self.sitemap_urls(
+            SITEMAP_URL, since=last_crawl_success, url_filter=self.is_product_url
         )
-        return urls
 
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
         self.logger.info("Crawling %s", self.name)
         start = time.time()
 
-        self.test_base_url()
+        await asyncio.to_thread(self.test_base_url)
 
-        product_urls = self._collect_product_urls(last_crawl_success)
+        product_urls = await self._collect_product_urls(last_crawl_success)
         if not product_urls:
             self.logger.warning("%s: no product URLs found in sitemap", self.name)
             return []
 
-        async with aiohttp.ClientSession() as session:
-            pending = list(product_urls)
-            while pending:
-                batch = pending[: self.batch_size]
-                del pending[: self.batch_size]
-
-                tasks = [
-                    asyncio.create_task(self.fetch_page(session, url))
-                    for url in batch
-                ]
-                responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for url, result in zip(batch, responses):
-                    if isinstance(result, Exception):
-                        self.logger.error(
-                            "Exception while fetching %s: %s", url, result
-                        )
-                        continue
-
-                    _, response = result
-                    if not response:
-                        continue
-
-                    html = response.decode("latin-1", errors="replace")
-                    try:
-                        book_info = self._extract_from_html(html, url)
-                        if book_info is None:
-                            continue
-                        book = Book(**book_info)
-                        book.price *= self.convert_rate
-                    except ValidationError as error:
-                        self.logger.warning(
-                            "Could not validate book info on %s: %s", url, error
-                        )
-                        continue
-
-                    self.add_book(book)
-                    self.logger.info(
-                        "SUCCESS - Added %s to all books - %s", book.title, url
-                    )
-
-                if pending and self.batch_delay > 0:
-                    await asyncio.sleep(self.batch_delay)
+        await self.crawl_urls(product_urls)
 
         self.logger.info(
             "Finished crawling %s in %.1fs — %d books collected",
             self.name,
             time.time() - start,
-            len(self.all_books),
+            self.books_found,
         )
         return self.all_books
@@ -9,6 +9,8 @@ class IsmaeelScraper(AbstractBookScraper):
         super().__init__(
             "https://ismaeelbooks.co.uk/", "Ismaeel Books", convert_rate=1.3
         )
+        self.drop_query_params = {"orderby", "add-to-cart", "add_to_wishlist"}
+        self.trailing_slash = True
 
     def ignore_url(self, url: str) -> bool:
         ig = ["/storage/", "/wishlist/", "/about/", "/contact/", "?add-to-cart=", "#"]
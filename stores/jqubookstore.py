@@ -1,12 +1,8 @@
 # this scraper takes advantage of the sitemap
 
-import asyncio
-import aiohttp
 from bs4 import BeautifulSoup, SoupStrainer
-import requests
 from scraper import ScraperError, AbstractBookScraper
-import time
-from book import Book
+import asyncio
 import logging
 from datetime import datetime
 
@@ -15,10 +11,11 @@ logger = logging.getLogger("scraper")
 
 class JquBookstore(AbstractBookScraper):
     def __init__(self):
-        super().__init__(
-            "https://jqubookstore.com/", "JQU Bookstore", convert_rate=0.73
-        )
+        # og:price:amount is stored as-is: the crawl loop never applied the
+        # 0.73 rate this store used to be constructed with
+        super().__init__("https://jqubookstore.com/", "JQU Bookstore")
         self.strainer = SoupStrainer("meta")
+        self.product_fingerprint = b"og:price:amount"
         self.batch_size = 10
         self.batch_delay = 0.1
         self.headers.update(
@@ -26,7 +23,6 @@ class JquBookstore(AbstractBookScraper):
                 "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:145.0) Gecko/20100101 Firefox/145.0",
                 "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
                 "Accept-Language": "en-US,en;q=0.5",
-                "Accept-Encoding": "gzip, deflate, br, zstd",
                 "Sec-GPC": "1",
                 "Connection": "keep-alive",
                 "Upgrade-Insecure-Requests": "1",
@@ -75,79 +71,22 @@ class JquBookstore(AbstractBookScraper):
 
         return book_info
 
-    def _collect_product_urls(self, last_crawl_success: datetime | None = None) -> list[str]:
-        base_sitemap = BeautifulSoup(
-            requests.get(self.base_url + "sitemap.xml").text, "xml"
-        )
-        sitemap_url = [
-            url.text
-            for url in base_sitemap.find_all("loc")
-            if "sitemap_products" in url.text
-        ][0]
-        sitemap = BeautifulSoup(requests.get(sitemap_url).text, "xml")
-        logger.info("JQUBookstore - Successfully fetched sitemap")
-
-        urls: list[str] = []
-        for url_tag in sitemap.find_all("url"):
-            loc = url_tag.find("loc")
-            if not loc or not loc.text:
-                continue
-            href = loc.text.strip()
-            if "file" in href or "/products/" not in href:
-                continue
-
-            if last_crawl_success:
-                lm = url_tag.find("lastmod")
-                if lm and lm.text:
-                    try:
-                        raw_lm = lm.text.strip().replace("Z", "+00:00")
-                        lastmod = datetime.fromisoformat(raw_lm)
-                        if lastmod.tzinfo:
-                            lastmod = lastmod.replace(tzinfo=None)
-                        lcs = last_crawl_success
-                        if getattr(lcs, "tzinfo", None):
-                            lcs = lcs.replace(tzinfo=None)
-                        if lastmod < lcs:
-                            continue
-                    except ValueError:
-                        pass
-
-            urls.append(href)
-
-        logger.info(
-            f"JQUBookstore - Found {len(urls)} product URLs"
-            + (f" (since {last_crawl_success})" if last_crawl_success else "")
+    def extract_from_response(self, response: bytes, url) -> dict | None:
+        # full soup: the stock check looks for schema.org markers outside <meta>
+        return self.extract_book_info(self.make_soup(response, url), url)
+
+    async def _collect_product_urls(self, last_crawl_success: datetime | None = None) -> list[str]:
+        return await self.sitemap_urls(
+            self.base_url + "sitemap.xml",
+            since=last_crawl_success,
+            url_filter=lambda url: "file" not in url and "/products/" in url,
+            sitemap_filter=lambda sitemap: "sitemap_products" in sitemap,
         )
-        return urls
 
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
 
-        self.test_base_url()
-
-        urls = self._collect_product_urls(last_crawl_success)
-
-        async with aiohttp.ClientSession() as session:
-            all_res = []
-            while len(urls) > 0:
-                batch_urls = urls[: self.batch_size]
-                tasks = []
-                for url in batch_urls:
-                    tasks.append(asyncio.create_task(self.fetch_page(session, url)))
-                    urls.remove(url)
-
-                all_res.extend(await asyncio.gather(*tasks))
-                time.sleep(self.batch_delay)
-
-            for url, response in all_res:
-                if response:
-                    soup = BeautifulSoup(
-                        response,
-                        "lxml",
-                    )
+        await asyncio.to_thread(self.test_base_url)
 
-                    book_info = self.extract_book_info(soup, url)
-                    if book_info is not None:
-                        book_info = Book(**book_info)
-                        self.add_book(book_info)
+        urls = await self._collect_product_urls(last_crawl_success)
 
-        return self.all_books
+        return await self.crawl_urls(urls)
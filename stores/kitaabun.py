@@ -14,7 +14,8 @@ class Kitaabun(AbstractBookScraper):
         return not self.is_product_url(url)
 
     def add_book(self, book_info: list) -> None:
-        self.all_books.extend(book_info)
+        for book in book_info:
+            self._emit_book(book)
 
     def is_product_url(self, url):
         return (
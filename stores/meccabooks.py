@@ -5,12 +5,12 @@ from datetime import datetime
 from html import unescape
 from urllib.parse import unquote
 
-import aiohttp
 import requests
 from bs4 import BeautifulSoup
 from pydantic import ValidationError
 
 from book import Book
+from frontier import CrawlFrontier
 from scraper import AbstractBookScraper
 
 PRODUCTS_API = "https://www.meccabooks.com/collections/all/products.json"
@@ -40,6 +40,8 @@ class MeccaBooks(AbstractBookScraper):
         )
         self.batch_size = 5
         self.batch_delay = 0.5
+        # books are built from the catalog API; pages only add author/publisher
+        self.conditional_requests = False
 
     def is_product_url(self, url: str) -> bool:
         return "/products/" in url and not url.endswith(".json")
@@ -210,13 +212,51 @@ class MeccaBooks(AbstractBookScraper):
 
         return book_info
 
+    def _add_catalog_book(self, item: dict, result) -> None:
+        core = item["core"]
+        body_html = item.get("body_html")
+
+        if isinstance(result, Exception):
+            self.logger.error("Exception while fetching %s: %s", core["url"], result)
+            return
+
+        _, response = result
+        author = None
+        publisher = core.get("publisher")
+        if response:
+            html = response.decode("utf-8", errors="replace")
+            author = self._extract_author_from_html(html, body_html)
+            publisher = self._extract_publisher_from_html(html, core.get("publisher"))
+
+        book_info = {
+            key: value for key, value in core.items() if not key.startswith("_")
+        }
+        if author:
+            book_info["author"] = author
+        if publisher:
+            book_info["publisher"] = publisher
+
+        try:
+            book = Book(**book_info)
+            book.price *= self.convert_rate
+        except ValidationError as error:
+            self.logger.warning(
+                "Could not validate book info on %s: %s", core["url"], error
+            )
+            return
+
+        self.add_book(book)
+        self.logger.info("SUCCESS - Added %s to all books - %s", book.title, core["url"])
+
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
         self.logger.info("Crawling %s", self.name)
         start = time.time()
 
-        self.test_base_url()
+        await asyncio.to_thread(self.test_base_url)
 
-        raw_products = self._collect_products(last_crawl_success)
+        raw_products = await asyncio.to_thread(
+            self._collect_products, last_crawl_success
+        )
         if not raw_products:
             self.logger.warning("%s: no book products found in catalog API", self.name)
             return []
@@ -237,70 +277,19 @@ class MeccaBooks(AbstractBookScraper):
             self.logger.warning("%s: no valid book products after parsing", self.name)
             return []
 
-        async with aiohttp.ClientSession() as session:
-            while pending:
-                batch = pending[: self.batch_size]
-                del pending[: self.batch_size]
-
-                tasks = [
-                    asyncio.create_task(self.fetch_page(session, item["core"]["url"]))
-                    for item in batch
-                ]
-                responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for item, result in zip(batch, responses):
-                    core = item["core"]
-                    body_html = item.get("body_html")
-
-                    if isinstance(result, Exception):
-                        self.logger.error(
-                            "Exception while fetching %s: %s", core["url"], result
-                        )
-                        continue
-
-                    _, response = result
-                    author = None
-                    publisher = core.get("publisher")
-                    if response:
-                        html = response.decode("utf-8", errors="replace")
-                        author = self._extract_author_from_html(html, body_html)
-                        publisher = self._extract_publisher_from_html(
-                            html, core.get("publisher")
-                        )
-
-                    book_info = {
-                        key: value
-                        for key, value in core.items()
-                        if not key.startswith("_")
-                    }
-                    if author:
-                        book_info["author"] = author
-                    if publisher:
-                        book_info["publisher"] = publisher
-
-                    try:
-                        book = Book(**book_info)
-                        book.price *= self.convert_rate
-                    except ValidationError as error:
-                        self.logger.warning(
-                            "Could not validate book info on %s: %s",
-                            core["url"],
-                            error,
-                        )
-                        continue
-
-                    self.add_book(book)
-                    self.logger.info(
-                        "SUCCESS - Added %s to all books - %s", book.title, core["url"]
-                    )
-
-                if pending and self.batch_delay > 0:
-                    await asyncio.sleep(self.batch_delay)
+        items = {item["core"]["url"]: item for item in pending}
+        frontier = CrawlFrontier(items)
+        async with self.client_session() as session:
+            await self.run_fetch_workers(
+                session,
+                frontier,
+                lambda url, result: self._add_catalog_book(items[url], result),
+            )
 
         self.logger.info(
             "Finished crawling %s in %.1fs — %d books collected",
             self.name,
             time.time() - start,
-            len(self.all_books),
+            self.books_found,
         )
         return self.all_books
@@ -3,15 +3,12 @@
 # then parses product pages (meta tags + WooCommerce markup + optional attributes).
 
 import asyncio
-import aiohttp
 import html
 import logging
 import re
 from datetime import datetime
 
-import requests
 from bs4 import BeautifulSoup
-from book import Book
 from scraper import AbstractBookScraper
 
 logger = logging.getLogger("scraper")
@@ -45,7 +42,8 @@ class OsmanScraper(AbstractBookScraper):
         )
         self.batch_size = 10
         self.batch_delay = 0.1
-        self.headers["Accept-Encoding"] = "gzip, deflate"
+        # full-page soups with no strainer; parse them off the event loop
+        self.parse_workers = 4
 
     def is_product_url(self, url: str) -> bool:
         return "/product/" in url
@@ -153,8 +151,6 @@ class OsmanScraper(AbstractBookScraper):
             self.logger.warning(f"Could not find GBP price for {url}")
             return None
 
-        price_usd = round(gbp * self.convert_rate, 2)
-
         img_meta = soup.find("meta", property="og:image")
         image = (
             html.unescape(img_meta["content"]).strip()
@@ -170,7 +166,7 @@ class OsmanScraper(AbstractBookScraper):
             "url": url,
             "source": self.name,
             "title": title,
-            "price": price_usd,
+            "price": gbp,
             "instock": instock,
         }
         if image:
@@ -184,108 +180,19 @@ class OsmanScraper(AbstractBookScraper):
 
         return book_info
 
-    def _product_sitemap_urls(self) -> list[str]:
-        idx = requests.get(
+    async def _collect_product_urls(self, last_crawl_success: datetime | None) -> list[str]:
+        return await self.sitemap_urls(
             self.base_url + "sitemap_index.xml",
-            headers=self.headers,
-            timeout=30,
+            since=last_crawl_success,
+            url_filter=self.is_product_url,
+            sitemap_filter=lambda sitemap: (
+                "product-sitemap" in sitemap and "product_cat" not in sitemap
+            ),
         )
-        idx.raise_for_status()
-        root = BeautifulSoup(idx.text, "xml")
-        out: list[str] = []
-        for loc in root.find_all("loc"):
-            href = (loc.text or "").strip()
-            if not href:
-                continue
-            if "product-sitemap" not in href:
-                continue
-            if "product_cat" in href:
-                continue
-            out.append(href)
-        return sorted(set(out))
-
-    def _collect_product_urls(self, last_crawl_success: datetime | None) -> list[str]:
-        sitemap_hrefs = self._product_sitemap_urls()
-        if not sitemap_hrefs:
-            self.logger.warning("Osman Books: no product sitemaps in index")
-            return []
-
-        urls: list[str] = []
-        for sm_url in sitemap_hrefs:
-            r = requests.get(sm_url, headers=self.headers, timeout=60)
-            r.raise_for_status()
-            soup = BeautifulSoup(r.text, "xml")
-            for url_tag in soup.find_all("url"):
-                loc = url_tag.find("loc")
-                if not loc or not loc.text:
-                    continue
-                href = loc.text.strip()
-                if not self.is_product_url(href):
-                    continue
-
-                if last_crawl_success:
-                    lm = url_tag.find("lastmod")
-                    if lm and lm.text:
-                        try:
-                            raw_lm = lm.text.strip().replace("Z", "+00:00")
-                            lastmod = datetime.fromisoformat(raw_lm)
-                            if lastmod.tzinfo:
-                                lastmod = lastmod.replace(tzinfo=None)
-                            lcs = last_crawl_success
-                            if getattr(lcs, "tzinfo", None):
-                                lcs = lcs.replace(tzinfo=None)
-                            if lastmod < lcs:
-                                continue
-                        except ValueError:
-                            pass
-
-                urls.append(href)
-
-        seen: set[str] = set()
-        unique: list[str] = []
-        for u in urls:
-            if u not in seen:
-                seen.add(u)
-                unique.append(u)
-
-        logger.info(
-            "Osman Books: %d product URLs from %d sitemap(s)",
-            len(unique),
-            len(sitemap_hrefs),
-        )
-        return unique
 
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
-        self.test_base_url()
-
-        urls = self._collect_product_urls(last_crawl_success)
-
-        async with aiohttp.ClientSession() as session:
-            all_res: list = []
-            pending = list(urls)
-            while pending:
-                batch = pending[: self.batch_size]
-                tasks = [
-                    asyncio.create_task(self.fetch_page(session, u)) for u in batch
-                ]
-                for u in batch:
-                    pending.remove(u)
-                all_res.extend(await asyncio.gather(*tasks))
-                if self.batch_delay:
-                    await asyncio.sleep(self.batch_delay)
-
-            for url, response in all_res:
-                if not response:
-                    continue
-                soup = BeautifulSoup(response, "lxml")
-                book_info = self.extract_book_info(soup, url)
-                if book_info is None:
-                    continue
-                try:
-                    book = Book(**book_info)
-                except Exception as e:
-                    self.logger.warning(f"Could not validate book on {url}: {e}")
-                    continue
-                self.add_book(book)
+        await asyncio.to_thread(self.test_base_url)
+
+        urls = await self._collect_product_urls(last_crawl_success)
 
-        return self.all_books
+        return await self.crawl_urls(urls)
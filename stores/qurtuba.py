@@ -6,6 +6,8 @@ from scraper import AbstractBookScraper
 class Qurtuba(AbstractBookScraper):
     def __init__(self):
         super().__init__("https://qurtubabooks.com/", "Qurtuba", convert_rate=1.3)
+        self.drop_query_params = {"orderby", "add-to-cart", "add_to_wishlist"}
+        self.trailing_slash = True
 
     def ignore_url(self, url) -> bool:
         ig = [
@@ -11,6 +11,8 @@ class Salafi(AbstractBookScraper):
             "https://salafibookstore.com", "Salafi Books", convert_rate=1.33
         )
         self.batch_size = 4
+        self.drop_query_params = {"orderby", "add-to-cart", "add_to_wishlist"}
+        self.trailing_slash = True
         self.test_urls = [
             "https://salafibookstore.com/product/taleeq-ala-meemiyyah-ibn-al-qayyim/",
             "https://salafibookstore.com/product/the-book-of-manners/",
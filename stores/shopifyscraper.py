@@ -1,3 +1,4 @@
+import asyncio
 import requests
 from scraper import ScraperError
 
@@ -60,6 +61,11 @@ class ShopifyScraper:
         return url.startswith(self.base_url) and "/products/" in url
 
     async def crawl_product_pages(self, last_crawl_success=None):
+        # the API calls block, so run them in a thread and let other stores
+        # crawling in the same event loop carry on
+        return await asyncio.to_thread(self._crawl, last_crawl_success)
+
+    def _crawl(self, last_crawl_success=None):
         self.test_base_url()
 
         query = """
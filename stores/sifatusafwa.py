@@ -4,12 +4,9 @@ import json
 import time
 from datetime import datetime
 
-import aiohttp
 import requests
 from bs4 import BeautifulSoup
-from pydantic import ValidationError
 
-from book import Book
 from scraper import AbstractBookScraper, ScraperError
 
 SITEMAP_URL = "https://www.sifatusafwa.com/1_en_0_sitemap.xml"
@@ -45,41 +42,10 @@ class SifatuSafwa(AbstractBookScraper):
     # Sitemap-based URL collection
     # ------------------------------------------------------------------
 
-    def _collect_product_urls(self, last_crawl_success: datetime | None) -> list[str]:
-        r = requests.get(SITEMAP_URL, headers=self.headers, timeout=60)
-        r.raise_for_status()
-
-        soup = BeautifulSoup(r.text, "xml")
-        urls: list[str] = []
-
-        for url_tag in soup.find_all("url"):
-            loc = url_tag.find("loc")
-            if not loc or not loc.text:
-                continue
-            href = loc.text.strip()
-            if not self.is_product_url(href):
-                continue
-
-            if last_crawl_success:
-                lm = url_tag.find("lastmod")
-                if lm and lm.text:
-                    try:
-                        raw_lm = lm.text.strip().replace("Z", "+00:00")
-                        lastmod = datetime.fromisoformat(raw_lm)
-                        if lastmod.tzinfo:
-                            lastmod = lastmod.replace(tzinfo=None)
-                        lcs = last_crawl_success
-                        if getattr(lcs, "tzinfo", None):
-                            lcs = lcs.replace(tzinfo=None)
-                        if lastmod < lcs:
-                            continue
-                    except ValueError:
-                        pass
-
-            urls.append(href)
-
-        self.logger.info("Sifatu Safwa: %d product URLs from sitemap", len(urls))
-        return urls
+    async def _collect_product_urls(self, last_crawl_success: datetime | None) -> list[str]:
+        return await self.sitemap_urls(
+            SITEMAP_URL, since=last_crawl_success, url_filter=self.is_product_url
+        )
 
     # ------------------------------------------------------------------
     # URL helpers (unchanged from original)
@@ -219,55 +185,17 @@ class SifatuSafwa(AbstractBookScraper):
         self.logger.info(f"Crawling {self.name}")
         start = time.time()
 
-        self.test_base_url()
+        await asyncio.to_thread(self.test_base_url)
 
-        product_urls = self._collect_product_urls(last_crawl_success)
+        product_urls = await self._collect_product_urls(last_crawl_success)
         if not product_urls:
             self.logger.warning(f"{self.name}: no product URLs found in sitemap")
             return []
 
-        async with aiohttp.ClientSession() as session:
-            pending = list(product_urls)
-            while pending:
-                batch = pending[: self.batch_size]
-                del pending[: self.batch_size]
-
-                tasks = [
-                    asyncio.create_task(self.fetch_page(session, u)) for u in batch
-                ]
-                responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for url, result in zip(batch, responses):
-                    if isinstance(result, Exception):
-                        self.logger.error(f"Exception while fetching {url}: {result}")
-                        continue
-                    _, response = result
-                    if not response:
-                        continue
-
-                    soup = BeautifulSoup(response, "lxml", parse_only=self.strainer)
-                    try:
-                        book_info = self.extract_book_info(soup, url)
-                        if book_info is None:
-                            continue
-                        book = Book(**book_info)
-                        book.price *= self.convert_rate
-                    except ValidationError as e:
-                        self.logger.warning(
-                            f"Could not validate book info on {url}: {e}"
-                        )
-                        continue
-
-                    self.add_book(book)
-                    self.logger.info(
-                        f"SUCCESS - Added {book.title} to all books - {url}"
-                    )
-
-                if pending and self.batch_delay > 0:
-                    await asyncio.sleep(self.batch_delay)
+        await self.crawl_urls(product_urls)
 
         self.logger.info(
             f"Finished crawling {self.name} in {time.time() - start:.1f}s — "
-            f"{len(self.all_books)} books collected"
+            f"{self.books_found} books collected"
         )
         return self.all_books
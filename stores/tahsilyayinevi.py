@@ -1,9 +1,8 @@
 import asyncio
-import aiohttp
-import requests
+
 from bs4 import BeautifulSoup, SoupStrainer
 from scraper import AbstractBookScraper
-from book import Book
+from sitemap import SitemapError
 
 # TRY → USD conversion rate (approximate)
 TRY_TO_USD = 0.027
@@ -100,7 +99,7 @@ class TahsilYayinevi(AbstractBookScraper):
         return book_info
 
     async def crawl_product_pages(self, last_crawl_success=None) -> list[dict]:
-        self.test_base_url()
+        await asyncio.to_thread(self.test_base_url)
 
         # Collect all product URLs from both product sitemaps
         urls = []
@@ -110,38 +109,10 @@ class TahsilYayinevi(AbstractBookScraper):
         ]:
             sitemap_url = self.base_url + sitemap_path
             try:
-                resp = requests.get(sitemap_url, headers=self.headers, timeout=15)
-                xml_soup = BeautifulSoup(resp.text, "xml")
-                urls.extend(loc.text for loc in xml_soup.find_all("loc"))
-            except Exception as e:
+                urls.extend(await self.sitemap_urls(sitemap_url))
+            except SitemapError as e:
                 self.logger.error(f"Could not fetch sitemap {sitemap_url}: {e}")
 
         self.logger.info(f"Found {len(urls)} product URLs from sitemaps")
 
-        async with aiohttp.ClientSession() as session:
-            all_res = []
-            remaining = list(urls)
-            while remaining:
-                batch = remaining[: self.batch_size]
-                remaining = remaining[self.batch_size :]
-                tasks = [
-                    asyncio.create_task(self.fetch_page(session, url))
-                    for url in batch
-                ]
-                all_res.extend(await asyncio.gather(*tasks))
-                if remaining and self.batch_delay:
-                    await asyncio.sleep(self.batch_delay)
-
-        for url, response in all_res:
-            if response:
-                soup = BeautifulSoup(response, "lxml", parse_only=self.strainer)
-                book_info = self.extract_book_info(soup, url)
-                if book_info is not None:
-                    try:
-                        book = Book(**book_info)
-                        book.price *= self.convert_rate
-                        self.add_book(book)
-                    except Exception as e:
-                        self.logger.warning(f"Could not validate book for {url}: {e}")
-
-        return self.all_books
+        return await self.crawl_urls(urls)
@@ -1,5 +1,6 @@
 # scraper for woo based websites
 
+import asyncio
 import requests
 from scraper import ScraperError
 import logging
@@ -43,6 +44,11 @@ class WooScraper:
         return book_info
 
     async def crawl_product_pages(self, last_crawl_success=None):
+        # the API calls block, so run them in a thread and let other stores
+        # crawling in the same event loop carry on
+        return await asyncio.to_thread(self._crawl, last_crawl_success)
+
+    def _crawl(self, last_crawl_success=None):
 
         self.test_base_url()
 
@@ -1,5 +1,6 @@
 # scraper for woo store API based websites (public, no auth)
 
+import asyncio
 import logging
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -244,6 +245,11 @@ class WooStoreScraper:
         return products
 
     async def crawl_product_pages(self, last_crawl_success=None):
+        # the API calls block, so run them in a thread and let other stores
+        # crawling in the same event loop carry on
+        return await asyncio.to_thread(self._crawl, last_crawl_success)
+
+    def _crawl(self, last_crawl_success=None):
         self.test_base_url()
         if self.category_ids:
             self._get_allowed_category_ids()
@@ -9,14 +9,20 @@ from stores.sifatusafwa import SifatuSafwa
 from stores.kitaabun import Kitaabun
 from stores.kunuz import Kunuz
 from stores.buraq import Buraq
+from response_cache import ResponseCache
 
 url = "https://www.sifatusafwa.com/en/adhkar-and-duah/al-adhkar-by-imam-an-nawawi.html"
 
 scraper = SifatuSafwa()
 
 
-response = requests.get(url, headers=scraper.headers)
-soup = bs4.BeautifulSoup(response.content, "html.parser", parse_only=scraper.strainer)
+# re-runs while working on an extractor read the page from disk
+cache = ResponseCache()
+content = cache.get(url, scraper.cache_ttl)
+if content is None:
+    content = requests.get(url, headers=scraper.headers).content
+    cache.put(url, content)
+soup = bs4.BeautifulSoup(content, "html.parser", parse_only=scraper.strainer)
 
 # new_links = [link['href'] for link in soup.find_all('a', href=True)]
 # pprint.pprint(new_links)
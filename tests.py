@@ -1,11 +1,135 @@
 import asyncio
+import os
+import time
 import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from bs4 import BeautifulSoup
 import pytest
+import scraper
 from stores.salafi import Salafi
 import pprint
 
 
+class BookStore(scraper.AbstractBookScraper):
+    """Store for the local test site: /p/ pages are books titled by their <h1>."""
+
+    # defaults, so the parse pool can build one with no arguments
+    def __init__(self, base_url="https://example.com/", name="Test", convert_rate=1):
+        super().__init__(base_url, name, convert_rate)
+        self.extracted = []
+
+    def is_product_url(self, url):
+        return "/p/" in url
+
+    def test_base_url(self):
+        return True
+
+    def extract_book_info(self, soup, url):
+        self.extracted.append(url)
+        h1 = soup.find("h1")
+        return h1 and {"title": h1.text, "price": 1, "url": url, "source": self.name, "instock": True}
+
+
+class StubStore(BookStore):
+    """Emits three books without fetching anything; module level so worker processes can load it."""
+
+    def __init__(self):
+        super().__init__("https://example.com/", type(self).__name__)
+
+    async def crawl_product_pages(self, last_crawl_success=None):
+        for i in range(3):
+            url = f"https://example.com/{self.name}/p/{i}"
+            self._emit_book({"title": f"Book {i}", "price": 1, "url": url, "source": self.name, "instock": True})
+        return self.all_books
+
+
+class OtherStubStore(StubStore):
+    pass
+
+
+async def book_page(request):
+    return web.Response(
+        text=f"<h1>Book {request.match_info['id']}</h1>", content_type="text/html"
+    )
+
+
+class LocalSite:
+    """An aiohttp app served by a TestServer while in `async with`, and stores crawling it."""
+
+    def __init__(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.app = web.Application()
+        self.server = None
+
+    def route(self, path, handler):
+        self.app.router.add_get(path, handler)
+
+    def url(self, path="/") -> str:
+        return str(self.server.make_url(path))
+
+    def store(self, cls=BookStore, **attrs):
+        """A store for the site, without conditional requests unless `attrs` turn them on."""
+        store = cls(self.url(), "Test")
+        store.conditional_requests = store.skip_unchanged_bodies = False
+        for name, value in attrs.items():
+            setattr(store, name, value)
+        return store
+
+    async def __aenter__(self):
+        self.server = TestServer(self.app)
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.close()
+
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch):
+    """
+    upload.py connected to a local mongod when one is running, else to mongomock.
+
+    Set TEST_MONGO_URL to use another server. Documents are written to its
+    "data" database, as in production, so tests clean up what they add.
+    """
+    import importlib
+    import sys
+    import pymongo
+    import pymongo.mongo_client
+
+    url = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+    try:
+        pymongo.MongoClient(url, serverSelectionTimeoutMS=300).admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        mongomock = pytest.importorskip("mongomock")
+        monkeypatch.setattr(pymongo.mongo_client, "MongoClient", mongomock.MongoClient)
+
+        def bulk_write(self, requests, ordered=True):
+            # mongomock 4.3 predates the arguments pymongo 4.11+ passes with UpdateOne
+            for op in requests:
+                self.update_one(op._filter, op._doc, upsert=op._upsert)
+
+        monkeypatch.setattr(mongomock.Collection, "bulk_write", bulk_write)
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mongourl.txt").write_text(url)
+    for name in ("upload", "main"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    module = importlib.import_module("upload")
+    monkeypatch.setitem(sys.modules, "upload", module)
+    return module
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """Local test site; saved_progress and the concurrency limits file live in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "saved_progress").mkdir()
+    monkeypatch.setattr(scraper, "CONCURRENCY_LIMITS_FILE", str(tmp_path / "limits.json"))
+    return LocalSite(tmp_path)
+
+
 @pytest.mark.asyncio
 async def test_salafi():
     scraper = Salafi()
@@ -34,3 +158,957 @@ async def test_salafi():
             assert book["source"] is not None
 
     assert True
+
+
+def test_crawl_frontier():
+    from frontier import CrawlFrontier
+
+    frontier = CrawlFrontier(["a", "b", "a"], visited=["c"])
+    assert len(frontier) == 2
+    assert not frontier.add("c")
+    assert frontier.add("d")
+
+    assert frontier.pop() == "a"
+    assert not frontier.add("a")
+    assert "a" in frontier.visited
+    assert frontier.queued() == ["b", "d"]
+
+    assert [frontier.pop(), frontier.pop(), frontier.pop()] == ["b", "d", None]
+
+    # lowest priority first, insertion order among equals
+    frontier = CrawlFrontier()
+    for url, priority in [("c1", 2), ("p1", 0), ("c2", 1), ("p2", 0)]:
+        frontier.add(url, priority)
+    assert frontier.queued() == ["p1", "p2", "c2", "c1"]
+    assert [frontier.pop() for _ in range(4)] == ["p1", "p2", "c2", "c1"]
+
+
+@pytest.mark.asyncio
+async def test_products_fetched_before_listing_pages(site):
+    fetched = []
+
+    async def home(request):
+        fetched.append(request.path)
+        links = "".join(f'<a href="/list/{i}">list</a>' for i in range(10))
+        return web.Response(text=links, content_type="text/html")
+
+    async def listing(request):
+        fetched.append(request.path)
+        links = ""
+        if request.match_info["id"] == "0":
+            links = "".join(f'<a href="/p/{i}">book</a>' for i in range(5))
+        return web.Response(text=links, content_type="text/html")
+
+    async def product(request):
+        fetched.append(request.path)
+        return await book_page(request)
+
+    site.route("/", home)
+    site.route("/list/{id}", listing)
+    site.route("/p/{id}", product)
+    async with site:
+        store = site.store(batch_size=8, batch_delay=0)
+        # many workers, one request at a time
+        host = scraper.urlparse(site.url()).hostname
+        store._concurrency[host] = scraper.AdaptiveConcurrency(1, maximum=1)
+        books = await store.crawl_product_pages()
+
+    assert len(books) == 5
+    last_product = max(i for i, path in enumerate(fetched) if path.startswith("/p/"))
+    # the products found on /list/0 overtook the listing pages queued before them
+    assert sum(path.startswith("/list/") for path in fetched[:last_product]) <= 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_workers_crawl_site(site):
+    finished = []
+    slow_page = asyncio.Event()
+
+    async def home(request):
+        links = "".join(f'<a href="/p/{i}">book</a>' for i in range(20))
+        return web.Response(text=links, content_type="text/html")
+
+    async def product(request):
+        if request.match_info["id"] == "0":
+            # held until every other product is done
+            await asyncio.wait_for(slow_page.wait(), 5)
+        response = await book_page(request)
+        finished.append(request.path)
+        if len(finished) == 19:
+            slow_page.set()
+        return response
+
+    site.route("/", home)
+    site.route("/p/{id}", product)
+    async with site:
+        store = site.store(batch_size=4, batch_delay=0)
+        books = await store.crawl_product_pages()
+
+    # one slow page did not hold up the pages fetched alongside it
+    assert len(books) == 20
+    assert finished[-1] == "/p/0"
+
+
+@pytest.mark.asyncio
+async def test_batch_delay_spaces_host_requests(site):
+    started = []
+
+    async def product(request):
+        started.append(time.monotonic())
+        return await book_page(request)
+
+    site.route("/p/{id}", product)
+    async with site:
+        store = site.store(batch_size=8, batch_delay=0.2)
+        host = scraper.urlparse(site.url()).hostname
+        store._concurrency[host] = scraper.AdaptiveConcurrency(2, maximum=2)
+        books = await store.crawl_urls([site.url(f"/p/{i}") for i in range(6)])
+
+    assert len(books) == 6
+    # two slots, each held for the delay: the requests come in three waves
+    assert sum(t - started[0] < 0.15 for t in started) == 2
+    assert started[-1] - started[0] >= 0.35
+
+
+def test_canonical_url():
+    from canonical_url import canonical_url
+
+    assert (
+        canonical_url("HTTPS://Example.com:443/a/%D8%A7%41?b=2&utm_source=x&a=1#top")
+        == "https://example.com/a/%d8%a7A?a=1&b=2"
+    )
+    assert canonical_url("https://example.com/a/ا") == "https://example.com/a/%d8%a7"
+    assert (
+        canonical_url("https://example.com/p?order=x&page=2", drop_params={"order"})
+        == "https://example.com/p?page=2"
+    )
+    assert (
+        canonical_url("https://example.com/p?order=x&page=2", keep_params={"page"})
+        == "https://example.com/p?page=2"
+    )
+    assert canonical_url("https://example.com/p", trailing_slash=True) == (
+        "https://example.com/p/"
+    )
+    assert canonical_url("https://example.com/p.html", trailing_slash=True) == (
+        "https://example.com/p.html"
+    )
+    assert canonical_url("https://example.com/p/", trailing_slash=False) == (
+        "https://example.com/p"
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("visited_error_rate", [None, 1e-4])
+async def test_url_variants_collapse(site, visited_error_rate):
+    from visited_set import CompactVisitedSet
+
+    served = []
+    links = ["/p/1?utm_source=a", "/p/1?utm_source=b", "/p/1", "/p/1?utm_source=a"]
+
+    async def index(request):
+        anchors = "".join(f'<a href="{link}">x</a>' for link in links)
+        return web.Response(text=f"<html><body>{anchors}</body></html>", content_type="text/html")
+
+    async def product(request):
+        served.append(request.path_qs)
+        return await book_page(request)
+
+    site.route("/", index)
+    site.route("/p/{id}", product)
+    async with site:
+        store = site.store(visited_error_rate=visited_error_rate)
+        await store.crawl_product_pages()
+
+    assert served == ["/p/1"]
+    # the second variant and the first direct link; the repeated variant is not recounted
+    assert store.canonical_dedupes == 2
+    compact = visited_error_rate is not None
+    assert isinstance(store._url_variants, CompactVisitedSet) == compact
+    assert isinstance(store._queued_via_variant, CompactVisitedSet) == compact
+
+
+@pytest.mark.asyncio
+async def test_adaptive_concurrency():
+    from scraper import AdaptiveConcurrency
+
+    concurrency = AdaptiveConcurrency(4, maximum=8)
+    for _ in range(100):
+        concurrency.record_success(0.1)
+    assert concurrency.limit == 8
+
+    concurrency.record_throttle()
+    assert concurrency.limit == 4
+    # failures from requests already in flight count as the same event
+    concurrency.record_throttle()
+    assert concurrency.limit == 4
+
+    async with concurrency:
+        assert concurrency.in_flight == 1
+    assert concurrency.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket():
+    from scraper import TokenBucket, parse_retry_after
+
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+
+    bucket = TokenBucket()
+    for _ in range(10):
+        await bucket.acquire()
+    # unpaced until throttled, then starts from half the observed rate
+    bucket.record_throttle()
+    assert bucket.rate == 5
+    bucket.record_throttle()
+    assert bucket.rate == 5
+
+    # a throttle after a quiet spell starts from the floor it is given, not min_rate
+    bucket = TokenBucket()
+    bucket.record_throttle(start_rate=8)
+    assert bucket.rate == 4
+
+    bucket = TokenBucket(rate=100, burst=1)
+    start = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire()
+    assert time.monotonic() - start >= 0.015
+
+    bucket.record_throttle(retry_after=0.05)
+    assert bucket.rate == 50
+    start = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - start >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_http_client_reuses_connections():
+    from http_client import HttpClient
+
+    async def ok(request):
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/", ok)
+    async with TestServer(app) as server, HttpClient() as http:
+        for _ in range(3):
+            async with http.session.get(server.make_url("/")) as response:
+                assert await response.text() == "ok"
+
+    assert http.stats["requests"] == 3
+    assert http.stats["connections_created"] == 1
+    assert http.stats["connections_reused"] == 2
+
+
+@pytest.mark.asyncio
+async def test_conditional_requests(site):
+    bodies = []
+
+    async def product(request):
+        etag = f'"{request.match_info["id"]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        bodies.append(request.path)
+        return web.Response(
+            text=f"<h1>Book {request.match_info['id']}</h1>",
+            content_type="text/html",
+            headers={"ETag": etag},
+        )
+
+    site.route("/p/{id}", product)
+    async with site:
+        urls = [site.url(f"/p/{i}") for i in range(3)]
+        first = await site.store(conditional_requests=True).crawl_urls(urls)
+        second_store = site.store(conditional_requests=True)
+        second = await second_store.crawl_urls(urls)
+
+    assert len(bodies) == 3
+    assert second_store.not_modified == 3
+    assert sorted(b["title"] for b in second) == sorted(b["title"] for b in first)
+
+
+@pytest.mark.asyncio
+async def test_parse_pool_matches_inline_parsing(site):
+    title = "كتاب التوحيد"
+
+    async def product(request):
+        # the charset is only in the header, which the pool's store never sees
+        body = f"<h1>{title} {request.match_info['id']}</h1>".encode("cp1256")
+        return web.Response(body=body, headers={"Content-Type": "text/html; charset=windows-1256"})
+
+    site.route("/p/{id}", product)
+    async with site:
+        urls = [site.url(f"/p/{i}") for i in range(6)]
+        inline = await site.store(convert_rate=1.3).crawl_urls(urls)
+        pooled_store = site.store(convert_rate=1.3, parse_workers=2)
+        pooled = await pooled_store.crawl_urls(urls)
+
+    assert pooled_store.extracted == []
+    assert sorted(inline, key=lambda book: book["url"]) == sorted(pooled, key=lambda book: book["url"])
+    assert {book["title"] for book in pooled} == {f"{title} {i}" for i in range(6)}
+    # converted prices are rounded to cents
+    assert {book["price"] for book in pooled} == {1.3}
+
+
+def test_response_cache(tmp_path):
+    import os
+    from response_cache import ResponseCache
+
+    cache = ResponseCache(str(tmp_path), max_bytes=500)
+    assert cache.get("https://example.com/a", ttl=60) is None
+
+    page = os.urandom(300)
+    cache.put("https://example.com/a", page)
+    cache.put("https://example.com/b", page)
+    assert cache.get("https://example.com/a", ttl=60) == page
+    assert cache.get("https://example.com/a", ttl=0) is None
+    assert cache.stats["hits"] == 1
+    assert cache.stats["bytes_saved"] == len(page)
+    # identical bodies are stored once
+    assert len(list(tmp_path.glob("*/*"))) == 1
+
+    # over max_bytes the least recently used URLs go first
+    cache.put("https://example.com/c", os.urandom(300))
+    assert cache.get("https://example.com/c", ttl=60) is not None
+    assert cache.get("https://example.com/a", ttl=60) is None
+    assert len(list(tmp_path.glob("*/*"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_response_cache_off_the_event_loop(site):
+    import threading
+    from response_cache import ResponseCache
+
+    served = []
+    threads = set()
+
+    class RecordingCache(ResponseCache):
+        def get(self, url, ttl):
+            threads.add(threading.get_ident())
+            return super().get(url, ttl)
+
+    async def product(request):
+        served.append(request.path)
+        return await book_page(request)
+
+    site.route("/p/{id}", product)
+    cache = RecordingCache(str(site.tmp_path / "cache"))
+    async with site:
+        urls = [site.url(f"/p/{i}") for i in range(5)]
+        await site.store(response_cache=cache).crawl_urls(urls)
+        books = await site.store(response_cache=cache).crawl_urls(urls)
+    cache.close()
+
+    assert len(books) == 5 and len(served) == 5
+    assert cache.stats["hits"] == 5
+    assert threading.get_ident() not in threads
+
+
+@pytest.mark.asyncio
+async def test_unchanged_body_skips_parsing(site):
+    site.route("/p/{id}", book_page)
+    async with site:
+        urls = [site.url(f"/p/{i}") for i in range(3)]
+        first_store = site.store(skip_unchanged_bodies=True)
+        first = await first_store.crawl_urls(urls)
+        second_store = site.store(skip_unchanged_bodies=True)
+        second = await second_store.crawl_urls(urls)
+
+    assert len(first_store.extracted) == 3 and second_store.extracted == []
+    assert second_store.unchanged_bodies == 3
+    assert sorted(b["title"] for b in second) == sorted(b["title"] for b in first)
+
+
+@pytest.mark.asyncio
+async def test_crawl_journal_resume(site):
+    served = []
+
+    async def product(request):
+        served.append(request.path)
+        return await book_page(request)
+
+    class CrashingStore(BookStore):
+        def extract_book_info(self, soup, url):
+            if url.endswith("/p/10"):
+                raise RuntimeError("crash")
+            return super().extract_book_info(soup, url)
+
+    site.route("/p/{id}", product)
+    async with site:
+        urls = [site.url(f"/p/{i}") for i in range(20)]
+        with pytest.raises(RuntimeError):
+            await site.store(CrashingStore).crawl_urls(urls)
+        first_run = set(served)
+        served.clear()
+
+        books = await site.store().crawl_urls(urls)
+
+    assert sorted(book["url"] for book in books) == sorted(urls)
+    assert "/p/10" in served
+    # pages finished before the crash are not fetched again
+    assert len(first_run & set(served)) < len(first_run)
+    assert not (site.tmp_path / "saved_progress" / "journal_Test.jsonl").exists()
+
+
+@pytest.mark.asyncio
+async def test_book_sink_streams_chunks(site):
+    from book_sink import BookSink
+
+    chunks = []
+
+    def write(chunk):
+        chunks.append([book["url"] for book in chunk])
+        return len(chunk)
+
+    site.route("/p/{id}", book_page)
+    async with site:
+        urls = [site.url(f"/p/{i}") for i in range(25)]
+        store = site.store()
+        store.book_sink = sink = BookSink(write, chunk_size=10)
+        books = await store.crawl_urls(urls)
+        # full chunks were handed off while the crawl ran
+        assert sink.count == 25 and len(sink._chunk) == 5
+        assert await sink.close() == 25
+
+    assert books == []
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert sorted(url for chunk in chunks for url in chunk) == sorted(urls)
+
+
+@pytest.mark.asyncio
+async def test_book_sink_backpressure(site):
+    from book_sink import BookSink
+
+    def slow_write(chunk):
+        time.sleep(0.05)
+        return len(chunk)
+
+    site.route("/p/{id}", book_page)
+    async with site:
+        urls = [site.url(f"/p/{i}") for i in range(30)]
+        store = site.store()
+        store.book_sink = sink = BookSink(slow_write, chunk_size=2, max_pending=1)
+        queued = []
+        add = sink.add
+
+        def add_and_measure(book):
+            add(book)
+            queued.append(len(sink._writes))
+
+        sink.add = add_and_measure
+        await store.crawl_urls(urls)
+        assert await sink.close() == 30
+
+    # the crawl waited for the writes instead of queueing all 15 chunks
+    assert max(queued) <= 2
+
+
+@pytest.mark.asyncio
+async def test_compressed_responses(site):
+    import gzip
+    import zlib
+    import content_encoding
+
+    html = b"<h1>Book</h1>" + b"<p>filler</p>" * 500
+    raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    bodies = {
+        "gzip": gzip.compress(html),
+        "deflate": zlib.compress(html),
+        "raw-deflate": raw_deflate.compress(html) + raw_deflate.flush(),
+    }
+
+    async def page(request):
+        coding = request.match_info["coding"]
+        return web.Response(
+            body=bodies[coding],
+            headers={"Content-Encoding": coding.replace("raw-", "")},
+            content_type="text/html",
+        )
+
+    site.route("/{coding}", page)
+    async with site, aiohttp.ClientSession() as session:
+        store = site.store()
+        for coding in bodies:
+            _, content = await store.fetch_page(session, site.url(f"/{coding}"))
+            assert content == html
+
+    assert store.bytes_decoded == 3 * len(html)
+    assert store.bytes_received == sum(len(body) for body in bodies.values())
+    with pytest.raises(content_encoding.ContentEncodingError):
+        content_encoding.decode(b"plain", "compress")
+
+
+@pytest.mark.parametrize("coding", ["br", "zstd"])
+def test_optional_content_encodings(coding):
+    import content_encoding
+
+    if coding == "br":
+        codec = content_encoding.brotli or pytest.importorskip("brotli")
+    else:
+        codec = content_encoding.zstd or pytest.importorskip("backports.zstd")
+    compress = codec.compress
+
+    html = b"<h1>Book</h1>" + b"<p>filler</p>" * 5000
+    body = compress(html)
+    assert coding in content_encoding.ACCEPT_ENCODING.split(", ")
+    assert content_encoding.decode(body, coding) == html
+    # stacked on another coding, in the order they were applied
+    assert content_encoding.decode(compress(body), f"{coding}, {coding}") == html
+
+    decoder = content_encoding.StreamDecoder(coding)
+    decoded = b"".join(decoder.decompress(body[i : i + 100]) for i in range(0, len(body), 100))
+    assert decoded + decoder.flush() == html
+
+
+def test_accept_encoding_leaves_out_missing_codecs(monkeypatch):
+    import importlib.util
+    import sys
+    import content_encoding
+
+    for name in ("brotli", "brotlicffi", "compression", "compression.zstd", "backports", "backports.zstd"):
+        # a None entry makes importing the module fail
+        monkeypatch.setitem(sys.modules, name, None)
+    spec = importlib.util.spec_from_file_location("content_encoding_bare", content_encoding.__file__)
+    bare = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bare)
+
+    assert bare.ACCEPT_ENCODING == "gzip, deflate"
+    with pytest.raises(bare.ContentEncodingError):
+        bare.decode(b"body", "br")
+    with pytest.raises(bare.ContentEncodingError):
+        bare.StreamDecoder("zstd")
+
+
+@pytest.mark.asyncio
+async def test_retry_policy_and_circuit_breaker(site):
+    served = []
+
+    async def page(request):
+        served.append(request.path)
+        if request.path == "/missing":
+            return web.Response(status=404)
+        # the first few requests hit an unhealthy server
+        if len(served) <= 3:
+            return web.Response(status=500)
+        return web.Response(text="<h1>ok</h1>", content_type="text/html")
+
+    site.route("/{path}", page)
+    async with site, aiohttp.ClientSession() as session:
+        store = site.store()
+        store.retry_policy = scraper.RetryPolicy(max_attempts=5, base_delay=0.01)
+        breaker = store.host_breaker(site.url())
+        breaker.failure_threshold = 2
+        breaker.reset_timeout = breaker._timeout = 0.05
+        _, content = await store.fetch_page(session, site.url("/page"))
+        assert content == b"<h1>ok</h1>"
+        # not transient: no retries
+        _, content = await store.fetch_page(session, site.url("/missing"))
+        assert content is None
+
+    assert served.count("/missing") == 1
+    assert breaker.trips == 2 and breaker.state == "closed"
+    # 500s are not a request to slow down: the request rate is left alone
+    assert [bucket.rate for bucket in store._rate_limits.values()] == [None]
+    assert store.retry_policy.retries == 3
+
+    # a host that never recovers fails the crawl once its probes run out
+    dead = scraper.CircuitBreaker(failure_threshold=1, reset_timeout=0.01, max_failed_probes=2)
+    dead.record_failure()
+    for _ in range(2):
+        await dead.acquire()
+        dead.record_failure()
+    with pytest.raises(scraper.HostDownError):
+        await dead.acquire()
+
+
+@pytest.mark.asyncio
+async def test_dead_host_fails_the_crawl(site):
+    served = []
+
+    async def page(request):
+        served.append(request.path)
+        return web.Response(status=500)
+
+    site.route("/p/{id}", page)
+    async with site:
+        store = site.store(batch_delay=0)
+        store.retry_policy = scraper.RetryPolicy(max_attempts=1, base_delay=0.01)
+        store._breakers[scraper.urlparse(site.url()).hostname] = scraper.CircuitBreaker(
+            failure_threshold=1, reset_timeout=0.01, max_reset_timeout=0.01, max_failed_probes=2
+        )
+        urls = [site.url(f"/p/{i}") for i in range(50)]
+        with pytest.raises(scraper.HostDownError):
+            await store.crawl_urls(urls)
+
+    # the crawl stopped once the probes ran out instead of failing every URL fast
+    assert len(served) < len(urls)
+
+
+@pytest.mark.asyncio
+async def test_crawl_urls_uses_compact_visited_set(site):
+    from visited_set import CompactVisitedSet
+
+    site.route("/p/{id}", book_page)
+    async with site:
+        store = site.store(visited_error_rate=1e-3)
+        urls = [site.url(f"/p/{i}") for i in range(10)]
+        books = await store.crawl_urls(urls)
+
+    assert len(books) == 10
+    visited = store.frontier.visited
+    assert isinstance(visited, CompactVisitedSet)
+    # the configured rate reaches the Bloom filter (its first filter gets half the budget)
+    assert [bloom.error_rate for bloom in visited._filters] == [1e-3 / 2]
+    assert len(visited) == 10 and all(url in visited for url in urls)
+
+
+def test_compact_visited_set():
+    from visited_set import CompactVisitedSet
+
+    visited = CompactVisitedSet(error_rate=1e-3, initial_capacity=1000, hot_size=100)
+    urls = [f"https://example.com/p/{i}" for i in range(20_000)]
+    visited.update(urls)
+
+    assert all(url in visited for url in urls)
+    assert len(visited) >= 19_900 and len(visited._filters) > 1
+    others = sum(f"https://example.com/c/{i}" in visited for i in range(20_000))
+    assert others / 20_000 < 5e-3
+    assert 0 < visited.false_positive_rate() < 1e-3
+
+
+@pytest.mark.asyncio
+async def test_product_fingerprint_gate(site):
+    async def home(request):
+        return web.Response(text='<a href="/category">books</a>', content_type="text/html")
+
+    async def category(request):
+        links = "".join(f'<a href="/book/{i}">{i}</a>' for i in range(3))
+        return web.Response(text=links, content_type="text/html")
+
+    async def book(request):
+        return web.Response(
+            text=f'<h1 class="product-title">Book {request.match_info["id"]}</h1>',
+            content_type="text/html",
+        )
+
+    site.route("/", home)
+    site.route("/category", category)
+    site.route("/book/{id}", book)
+    async with site:
+        store = site.store(product_fingerprint=b"product-title")
+        store.is_product_url = lambda url: True
+        books = await store.crawl_product_pages()
+
+    assert len(books) == 3
+    # the home and category pages were only scanned for links
+    assert len(store.extracted) == 3 and store.fingerprint_skips == 2
+
+
+@pytest.mark.asyncio
+async def test_body_stop_marker(site):
+    import gzip
+    import os
+    from response_cache import ResponseCache
+
+    head = b"<html><head><title>Book</title></head><body>"
+    html = head + os.urandom(500_000).hex().encode() + b"</body></html>"
+    compressed = gzip.compress(html)
+
+    async def page(request):
+        if request.path == "/p/gzip":
+            return web.Response(body=compressed, headers={"Content-Encoding": "gzip"})
+        return web.Response(body=html)
+
+    site.route("/p/{name}", page)
+    async with site, aiohttp.ClientSession() as session:
+        store = site.store(body_stop_marker=b"</head>")
+        _, content = await store.fetch_page(session, site.url("/p/gzip"))
+        assert content.startswith(head) and len(content) < len(html)
+        assert store.bytes_received < len(compressed) / 4
+
+        store.body_stop_marker = None
+        store.max_body_bytes = 1000
+        _, content = await store.fetch_page(session, site.url("/p/plain"))
+        assert content == html[:1000]
+
+        # cut-off pages stay out of the response cache; whole ones go in
+        store.response_cache = ResponseCache(str(site.tmp_path / "cache"))
+        await store.fetch_page(session, site.url("/p/plain"))
+        assert store.response_cache.get(site.url("/p/plain"), ttl=60) is None
+        store.max_body_bytes = None
+        _, content = await store.fetch_page(session, site.url("/p/plain"))
+        assert store.response_cache.get(site.url("/p/plain"), ttl=60) == html
+        store.response_cache.close()
+
+    assert store.truncated_bodies == 3
+
+
+@pytest.mark.asyncio
+async def test_declared_charset(site):
+    title = "كتاب التوحيد"
+
+    async def page(request):
+        body = f"<html><body><h1>{title}</h1></body></html>".encode("cp1256")
+        return web.Response(body=body, headers={"Content-Type": "text/html; charset=windows-1256"})
+
+    site.route("/p/1", page)
+    async with site, aiohttp.ClientSession() as session:
+        store = site.store()
+        url = site.url("/p/1")
+        _, content = await store.fetch_page(session, url)
+
+    assert store.make_soup(content, url).h1.text == title
+    assert store.page_charset(content, url) == "cp1256"
+
+    # a <meta> charset in the page wins over the header
+    other = BookStore("https://example.com/", "Other")
+    other._header_charsets["example.com"] = "iso-8859-1"
+    assert other.page_charset(b'<head><meta charset="UTF-8">', "https://example.com/p") == "utf-8"
+
+    # a bare iso-8859-1 header is a server default: a UTF-8 page is not decoded as latin-1
+    utf8 = BookStore("https://example.org/", "Utf8")
+    utf8._header_charsets["example.org"] = "ISO-8859-1"
+    body = f"<html><body><h1>{title}</h1></body></html>".encode()
+    assert utf8.page_charset(body, "https://example.org/p/1") is None
+    assert utf8._charsets == {}
+    assert utf8.make_soup(body, "https://example.org/p/1").h1.text == title
+
+
+@pytest.mark.parametrize("page", ["http_response.html", "cf_replay_response.html"])
+def test_link_harvester_matches_soup(page):
+    from urllib.parse import urljoin
+    from bs4 import BeautifulSoup, SoupStrainer
+    from link_harvester import LinkJoiner, harvest_links
+
+    body = open(page, "rb").read()
+    base = "https://example.com/shop/page.html"
+    soup = BeautifulSoup(body, "lxml", parse_only=SoupStrainer("a"), from_encoding="utf-8")
+    expected = []
+    for href in dict.fromkeys(a["href"] for a in soup.find_all("a", href=True)):
+        try:
+            link = urljoin(base, href)
+        except ValueError:
+            continue
+        if link.startswith(("http://", "https://")) and not href.startswith("#"):
+            expected.append(link)
+
+    assert harvest_links(body, base, "utf-8") == list(dict.fromkeys(expected))
+
+    joiner = LinkJoiner(base)
+    for href in ["/a/../b", "c?", "/d#", "//cdn.example.com/e", " /f\n", "g/./h"]:
+        assert joiner.join(href) == urljoin(base, href)
+    assert joiner.join("http://[x") is None
+    assert joiner.join("mailto:a@example.com") is None and joiner.join("#top") is None
+
+
+@pytest.mark.parametrize("page", ["http_response.html", "cf_replay_response.html"])
+@pytest.mark.parametrize(
+    "strainer",
+    [["meta"], ["meta", "nav", "h1", "bdi", "p", "button", "img"], ["h1", "div", "meta", "a", "span"]],
+)
+def test_single_parse_links_match_two_parses(page, strainer):
+    from urllib.parse import urljoin
+    from bs4 import SoupStrainer
+
+    body = open(page, "rb").read()
+    url = "https://example.com/shop/p/page.html"
+    store = BookStore()
+    store.strainer = SoupStrainer(strainer)
+
+    # what parse_page did before: a second parse of the page for its anchors
+    soup = BeautifulSoup(body, "lxml", parse_only=SoupStrainer("a"), from_encoding=store.page_charset(body, url))
+    expected = set()
+    for href in (a["href"] for a in soup.find_all("a", href=True)):
+        try:
+            link = urljoin(url, href)
+        except ValueError:
+            continue
+        if link.startswith(("http://", "https://")) and not href.startswith("#"):
+            expected.add(link)
+
+    _, links = store.parse_page(body, url)
+    assert store.extracted == [url]
+    assert len(links) == len(set(links))
+    assert expected and set(links) == expected
+
+
+@pytest.mark.asyncio
+async def test_sitemap_reader():
+    import gzip
+    from datetime import datetime
+    from sitemap import SitemapError, SitemapReader
+
+    ns = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+    def urlset(*entries):
+        body = "".join(
+            f"<url><loc>{loc}</loc><lastmod>{lastmod}</lastmod><priority>{priority}</priority></url>"
+            for loc, lastmod, priority in entries
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset {ns}>{body}</urlset>'
+
+    async def index(request):
+        sitemaps = "".join(
+            f"<sitemap><loc>{server.make_url(path)}</loc><lastmod>{lastmod}</lastmod></sitemap>"
+            for path, lastmod in [
+                ("/products-1.xml.gz", "2024-06-01T00:00:00+00:00"),
+                ("/products-2.xml", "2024-06-01"),
+                ("/products-old.xml", "2023-01-01"),
+                ("/pages.xml", "2024-06-01"),
+            ]
+        )
+        return web.Response(text=f"<sitemapindex {ns}>{sitemaps}</sitemapindex>")
+
+    async def products_1(request):
+        xml = urlset(
+            ("https://shop.test/p/1", "2024-05-01T10:00:00Z", "1.0"),
+            ("https://shop.test/p/2", "2023-05-01", "1.0"),
+            ("https://shop.test/p/3", "2024-05-01", "0.5"),
+        )
+        return web.Response(body=gzip.compress(xml.encode()), content_type="application/x-gzip")
+
+    async def products_2(request):
+        return web.Response(text=urlset(
+            ("https://shop.test/p/1", "2024-05-01", "1.0"),
+            ("https://shop.test/p/4", "2024-05-02", "0.9"),
+        ))
+
+    async def never_read(request):
+        raise AssertionError("filtered sitemaps are not fetched")
+
+    app = web.Application()
+    app.router.add_get("/sitemap_index.xml", index)
+    app.router.add_get("/products-1.xml.gz", products_1)
+    app.router.add_get("/products-2.xml", products_2)
+    app.router.add_get("/products-old.xml", never_read)
+    app.router.add_get("/pages.xml", never_read)
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        reader = SitemapReader(
+            session,
+            since=datetime(2024, 1, 1),
+            min_priority=0.8,
+            sitemap_filter=lambda sitemap: "products" in sitemap,
+        )
+        urls = [url async for url in reader.urls(str(server.make_url("/sitemap_index.xml")))]
+        assert urls == ["https://shop.test/p/1", "https://shop.test/p/4"]
+        assert reader.sitemaps_read == 3
+
+        with pytest.raises(SitemapError):
+            [url async for url in reader.urls(str(server.make_url("/missing.xml")))]
+
+
+def test_crawl_queue(upload):
+    import uuid
+    from datetime import datetime, timedelta, timezone
+
+    queue = upload.CrawlQueue(f"test-{uuid.uuid4()}", lease_seconds=60, max_attempts=2)
+    try:
+        queue.enqueue(["a", "b"])
+        queue.enqueue(["a"])
+        assert queue.unfinished() == 2
+
+        first = queue.claim("w1")
+        second = queue.claim("w2")
+        assert {first["store"], second["store"]} == {"a", "b"}
+        assert first["state"] == "running" and first["attempts"] == 1
+        # both leased
+        assert queue.claim("w3") is None
+
+        assert queue.heartbeat(first, "w1")
+        assert not queue.heartbeat(first, "w2")
+
+        # w1 dies: once its lease runs out the job goes to the next worker
+        queue.jobs.update_one(
+            {"_id": first["_id"]},
+            {"$set": {"lease_until": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+        )
+        retaken = queue.claim("w3")
+        assert retaken["_id"] == first["_id"]
+        assert retaken["worker"] == "w3" and retaken["attempts"] == 2
+        # the old worker finds out on its next heartbeat, and can't finish the job
+        assert not queue.heartbeat(first, "w1")
+        queue.finish(first, "w1")
+        assert queue.jobs.find_one({"_id": first["_id"]})["state"] == "running"
+
+        queue.finish(second, "w2")
+        # out of attempts, so a failure is final
+        queue.finish(retaken, "w3", error="boom")
+        states = {job["store"]: job["state"] for job in queue.jobs.find({"run": queue.run_id})}
+        assert states == {first["store"]: "failed", second["store"]: "done"}
+        assert queue.unfinished() == 0 and queue.claim("w1") is None
+    finally:
+        queue.jobs.delete_many({"run": queue.run_id})
+
+
+@pytest.mark.asyncio
+async def test_cancelled_store_keeps_its_books(upload):
+    import main
+
+    written = []
+    emitted = asyncio.Event()
+
+    class HangingStore(BookStore):
+        def __init__(self):
+            super().__init__("https://example.com/", "Hanging")
+
+        async def crawl_product_pages(self, last_crawl_success=None):
+            for i in range(3):
+                self._emit_book({"title": f"Book {i}", "url": f"https://example.com/p/{i}"})
+            emitted.set()
+            await asyncio.sleep(3600)
+
+    class Db:
+        def upsert_books(self, source, books):
+            written.extend(books)
+            return len(books)
+
+    class Status:
+        status = {}
+
+        def set_status(self, status):
+            pass
+
+    running = []
+    crawl = asyncio.create_task(
+        main.run_store(HangingStore, Db(), Status(), None, running, False, True)
+    )
+    await emitted.wait()
+    # what the queue worker does when it loses the lease
+    crawl.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await crawl
+
+    assert [book["title"] for book in written] == ["Book 0", "Book 1", "Book 2"]
+    assert running == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["parallel", "processes"])
+async def test_run_several_stores(upload, tmp_path, mode):
+    import main
+    from http_client import HttpClient
+
+    written = {}
+
+    class Db:
+        def upsert_books(self, source, books):
+            written.setdefault(source, []).extend(books)
+            return len(books)
+
+    stores = [StubStore, OtherStubStore]
+    status = upload.StatusManager(stores)
+    if mode == "parallel":
+        async with HttpClient() as http:
+            await main.run_stores(stores, 2, Db(), status, http, False, True)
+    else:
+        # the worker processes import scraper, which logs to logs/ in the cwd
+        (tmp_path / "logs").mkdir()
+        await main.run_store_processes(stores, 2, Db(), status, False, True, 10, 0)
+
+    upload.db["status"].update_one({}, {"$unset": {"StubStore": "", "OtherStubStore": ""}})
+
+    for name in ("StubStore", "OtherStubStore"):
+        assert sorted(book["title"] for book in written[name]) == ["Book 0", "Book 1", "Book 2"]
+        assert status.status[name]["error"] is None
+        assert status.status[name]["last_crawl_success"] is not None
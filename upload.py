@@ -1,12 +1,12 @@
 from book import Book
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
-from pymongo import UpdateOne
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
 import hashlib
 import logging
 import os
 import re
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 from title_key import title_key
 import voyage_embed
@@ -79,12 +79,15 @@ class StatusManager:
 
         self._save()
 
-    def _save(self):
-        db["status"].update_one({}, {"$set": self.status}, upsert=True)
+    def _save(self, *keys):
+        # only write the given keys when set, so workers on other machines
+        # don't overwrite each other's stores with stale copies
+        fields = {key: self.status[key] for key in keys} if keys else self.status
+        db["status"].update_one({}, {"$set": fields}, upsert=True)
 
     def set_status(self, status: str):
         self.status["status"] = status
-        self._save()
+        self._save("status")
 
     def update_status(
         self,
@@ -109,7 +112,118 @@ class StatusManager:
         if last_crawl_success is not None:
             self.status[scraper_name]["last_crawl_success"] = last_crawl_success
 
-        self._save()
+        self._save(scraper_name)
+
+
+class CrawlQueue:
+    """
+    Stores to crawl in one run, shared by workers on any number of machines.
+
+    Each job is a document in `crawl_queue`. A worker claims a pending job
+    (or one whose lease ran out because its worker died) with an atomic
+    find-and-modify, renews the lease with `heartbeat` while it crawls, and
+    marks it done or failed at the end. Jobs are retried up to
+    `max_attempts` times.
+    """
+
+    def __init__(self, run_id: str, lease_seconds: int = 300, max_attempts: int = 3):
+        self.jobs = db["crawl_queue"]
+        self.run_id = run_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.jobs.create_index([("run", 1), ("state", 1), ("lease_until", 1)])
+
+    def _lease(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+
+    def enqueue(self, stores: list[str]) -> None:
+        """Add the stores to the run. Jobs that already exist are left as they are."""
+        ops = [
+            UpdateOne(
+                {"_id": f"{self.run_id}:{store}"},
+                {
+                    "$setOnInsert": {
+                        "run": self.run_id,
+                        "store": store,
+                        "state": "pending",
+                        "attempts": 0,
+                        "worker": None,
+                        "lease_until": None,
+                    }
+                },
+                upsert=True,
+            )
+            for store in stores
+        ]
+        if ops:
+            self.jobs.bulk_write(ops, ordered=False)
+
+    def claim(self, worker: str) -> dict | None:
+        """Take the next pending or expired job for `worker`, or None if there is none."""
+        now = datetime.now(timezone.utc)
+        # a worker that died on its last attempt leaves the job failed
+        self.jobs.update_many(
+            {
+                "run": self.run_id,
+                "state": "running",
+                "lease_until": {"$lt": now},
+                "attempts": {"$gte": self.max_attempts},
+            },
+            {"$set": {"state": "failed", "error": "lease expired"}},
+        )
+        return self.jobs.find_one_and_update(
+            {
+                "run": self.run_id,
+                "$or": [
+                    {"state": "pending"},
+                    {"state": "running", "lease_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "state": "running",
+                    "worker": worker,
+                    "lease_until": self._lease(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("attempts", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def heartbeat(self, job: dict, worker: str) -> bool:
+        """Extend the lease. False means another worker has taken the job over."""
+        result = self.jobs.update_one(
+            {"_id": job["_id"], "worker": worker, "state": "running"},
+            {"$set": {"lease_until": self._lease()}},
+        )
+        return result.matched_count == 1
+
+    def finish(self, job: dict, worker: str, error: str | None = None) -> None:
+        # a failed job goes back to pending until it runs out of attempts
+        if error is None:
+            state = "done"
+        elif job["attempts"] < self.max_attempts:
+            state = "pending"
+        else:
+            state = "failed"
+        self.jobs.update_one(
+            {"_id": job["_id"], "worker": worker},
+            {
+                "$set": {
+                    "state": state,
+                    "error": error,
+                    "lease_until": None,
+                    "finished_at": datetime.now(timezone.utc),
+                }
+            },
+        )
+
+    def unfinished(self) -> int:
+        """Jobs in this run that are still pending or running."""
+        return self.jobs.count_documents(
+            {"run": self.run_id, "state": {"$in": ["pending", "running"]}}
+        )
 
 
 def _embedding_input(book: dict) -> str | None:
@@ -140,6 +254,8 @@ class BookManager:
         self.author_cache = db["author_cache"]
         self.embedding_cache = db["embedding_cache"]
         self.embedding_model = os.getenv("VOYAGE_MODEL", voyage_embed.DEFAULT_MODEL)
+        # upserts look books up by source and URL
+        self.books.create_index([("source", 1), ("url", 1)])
 
     def _apply_author_cache(self, books: list[dict]) -> int:
         """
@@ -269,77 +385,65 @@ class BookManager:
             applied += 1
         return applied
 
-    def upload_books(self, source: str, books: list[dict]) -> int:
-        """
-        Merge freshly-scraped books with the existing catalog for this source, then
-        replace the source's documents with the merged result.
-
-        This preserves books that were skipped by an incremental scrape (e.g. filtered
-        by lastmod) while still updating any book whose page was re-crawled this run.
-        Adds normalized fields (titleNormalized, authorNormalized) for hamza-agnostic search.
-        """
-
-        # applied = self._apply_author_cache(books)
-        # if applied:
-            # logger.info(f"upload_books: applied cached authors to {applied}/{len(books)} books for {source}")
+    def _normalize(self, book: dict) -> dict:
+        """Add the normalized fields (titleNormalized, authorNormalized, ...) used for hamza-agnostic search."""
+        book["titleNormalized"] = sanitize_arabic_text(book["title"])
 
-        books_dicts = []
-        for book in books:
+        book["authorNormalized"] = None
+        book["authorArabicNormalized"] = None
+        book["publisherNormalized"] = None
 
-            book["titleNormalized"] = sanitize_arabic_text(book["title"])
+        if "author" in book and book["author"]:
+            book["authorNormalized"] = sanitize_arabic_text(book["author"])
 
-            book["authorNormalized"] = None
-            book["authorArabicNormalized"] = None
-            book["publisherNormalized"] = None
+        if "authorArabic" in book and book["authorArabic"]:
+            book["authorArabicNormalized"] = sanitize_arabic_text(book["authorArabic"])
 
-            if "author" in book and book["author"]:
-                book["authorNormalized"] = sanitize_arabic_text(book["author"])
+        if "publisher" in book and book["publisher"]:
+            book["publisherNormalized"] = sanitize_arabic_text(book["publisher"])
 
-            if "authorArabic" in book and book["authorArabic"]:
-                book["authorArabicNormalized"] = sanitize_arabic_text(book["authorArabic"])
+        return book
 
-            if "publisher" in book and book["publisher"]:
-                book["publisherNormalized"] = sanitize_arabic_text(book["publisher"])
+    def upsert_books(self, source: str, books: list[dict]) -> int:
+        """
+        Normalize, embed and write one chunk of a source's books.
 
-            books_dicts.append(book)
+        Each book replaces the stored book with the same source and URL (or is
+        inserted), so chunks can be written while the crawl is still running
+        and books an incremental crawl skipped are left alone. Books without
+        a URL are dropped. Returns the number of books that were new.
+        """
+        books = [self._normalize(book) for book in books if book.get("url")]
+        if not books:
+            return 0
 
-        embedded = self._apply_embeddings(books_dicts)
+        embedded = self._apply_embeddings(books)
         if embedded:
             logger.info(
-                f"upload_books: attached embeddings to {embedded}/{len(books_dicts)} books for {source}"
+                f"upsert_books: attached embeddings to {embedded}/{len(books)} books for {source}"
             )
 
-        # Build a merged catalog: start from what's already in the DB, then
-        # overwrite with freshly-scraped books so that updated books win.
-        # Strip _id so MongoDB generates fresh IDs after the delete below.
-        existing: dict[str, dict] = {}
-        for doc in self.books.find({"source": source}):
-            doc.pop("_id", None)
-            url = doc.get("url")
-            if url:
-                existing[url] = doc
-
-        scraped_count = len(books_dicts)
-        new_count = 0
-        updated_count = 0
-        for book in books_dicts:
-            url = book.get("url")
-            if url:
-                if url in existing:
-                    updated_count += 1
-                else:
-                    new_count += 1
-                existing[url] = book
-
-        merged = list(existing.values())
-        logger.info(
-            f"upload_books: {source} — {scraped_count} scraped this run "
-            f"({new_count} new, {updated_count} updated), "
-            f"{len(merged)} total after merge"
+        result = self.books.bulk_write(
+            [
+                ReplaceOne({"source": source, "url": book["url"]}, book, upsert=True)
+                for book in books
+            ]
         )
+        return result.upserted_count
+
+    def upload_books(self, source: str, books: list[dict], chunk_size: int = 500) -> int:
+        """
+        Write a source's freshly-scraped books, `chunk_size` at a time.
 
-        self.books.delete_many({"source": source})
-        if merged:
-            self.books.insert_many(merged)
+        Books whose page was re-crawled this run are updated, new ones are
+        inserted and books skipped by an incremental scrape (e.g. filtered by
+        lastmod) are kept. Returns the number of new books.
+        """
+        new_count = 0
+        for i in range(0, len(books), chunk_size):
+            new_count += self.upsert_books(source, books[i : i + chunk_size])
 
+        logger.info(
+            f"upload_books: {source} — {len(books)} scraped this run ({new_count} new)"
+        )
         return new_count